@@ -7,11 +7,16 @@ Ensures all API calls always use a valid token without race conditions.
 
 import asyncio
 import time
-import configparser
 import os
 from typing import Optional
 import httpx
-from ..logger.logger import log_info, log_error
+from ..logger.logger import log_debug, log_info, log_error
+from ..global_var.global_var import get_http_client
+from ..utils.utils import CONFIG_PATH, json_loads, load_config
+
+# WECHAT_APPID / WECHAT_SECRET environment variables take precedence over [wechat] in config.ini
+_WECHAT_APPID = os.environ.get('WECHAT_APPID', '')
+_WECHAT_SECRET = os.environ.get('WECHAT_SECRET', '')
 
 
 def log_warning(message):
@@ -27,28 +32,49 @@ class WeChatTokenManager:
 
     def __init__(self):
         """Initialize the token manager."""
-        # Load configuration
-        config = configparser.ConfigParser()
-        config_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.ini')
-        if not config.read(config_path, encoding='utf-8'):
-            raise RuntimeError(f'Config file not found: {config_path}')
-        if not config.has_section('wechat'):
-            raise RuntimeError(f'[wechat] section not found in {config_path}')
-
-        self._appid = config.get('wechat', 'appid', fallback='')
-        self._secret = config.get('wechat', 'secret', fallback='')
+        self._appid = _WECHAT_APPID
+        self._secret = _WECHAT_SECRET
+        if not self._appid or not self._secret:
+            # Load configuration, only needed when the environment doesn't supply both credentials
+            config = load_config()
+            if not config.has_section('wechat'):
+                raise RuntimeError(f'[wechat] section not found in {CONFIG_PATH}')
+            self._appid = self._appid or config.get('wechat', 'appid', fallback='')
+            self._secret = self._secret or config.get('wechat', 'secret', fallback='')
+        
+        # Missing credentials can never yield a token, so detect it once up front
+        self._config_broken = not self._appid or not self._secret
+        if self._config_broken:
+            log_error("WeChat APPID or SECRET not configured")
         
-        # Token cache
+        # Token endpoint URL is fixed for the manager's lifetime, build it once
+        self._base_api_url = "https://api.weixin.qq.com/cgi-bin"
+        self._token_url = (f"{self._base_api_url}/token?"
+                           f"grant_type=client_credential&appid={self._appid}&secret={self._secret}")
+        
+        # Token cache, expiry is a time.monotonic() timestamp so NTP jumps can't skew it
         self._access_token: Optional[str] = None
         self._token_expires_at: float = 0
         
         # Concurrency control - initialize lock when needed
         self._refresh_lock: Optional[asyncio.Lock] = None
         self._refresh_in_progress = False
+        # In-flight refresh task shared by all callers waiting on the same refresh
+        self._refresh_task: Optional[asyncio.Task] = None
         
         # Buffer time before token expiry (5 minutes)
         self._refresh_buffer_seconds = 300
+        
+        # Proactive background refresh, fires this long before the refresh buffer starts
+        self._bg_task: Optional[asyncio.Task] = None
+        self._bg_refresh_margin_seconds = 60
+        # Background task that has finished sleeping and is refreshing right now
+        self._bg_refreshing_task: Optional[asyncio.Task] = None
+        
+        # Memoized get_token_info result with a short TTL
+        self._info_cache: dict = {}
+        self._info_cache_ts: float = 0
+        self._info_cache_ttl_seconds = 1.0
 
     def _get_refresh_lock(self) -> asyncio.Lock:
         """Get or create the refresh lock (lazy initialization)"""
@@ -62,59 +88,83 @@ class WeChatTokenManager:
         Returns cached token if valid, otherwise refreshes it.
         Thread-safe - multiple concurrent calls will not cause race conditions.
         """
-        current_time = time.time()
+        if self._config_broken:
+            return None
+        
+        current_time = time.monotonic()
         
         # Check if current token is still valid (with buffer)
         if (self._access_token and 
             current_time < (self._token_expires_at - self._refresh_buffer_seconds)):
-            log_info("Using cached WeChat access token")
+            log_debug("Using cached WeChat access token")
             return self._access_token
         
-        # Token needs refresh - use lock to prevent race conditions
-        refresh_lock = self._get_refresh_lock()
-        async with refresh_lock:
+        return await self._single_flight_refresh()
+
+    async def _single_flight_refresh(self, force: bool = False) -> Optional[str]:
+        """
+        Refresh the token so that only one HTTP call is in flight at a time.
+        Concurrent callers share the result of one refresh task.
+        
+        Args:
+            force: Refresh even if the cached token is still valid (background refresh)
+        """
+        # The lock only guards the single-flight bookkeeping,
+        # the HTTP call itself happens outside of it
+        async with self._get_refresh_lock():
             # Double-check after acquiring lock (another coroutine might have refreshed)
-            current_time = time.time()
-            if (self._access_token and 
+            current_time = time.monotonic()
+            if (not force and self._access_token and
                 current_time < (self._token_expires_at - self._refresh_buffer_seconds)):
-                log_info("Using cached WeChat access token (double-check)")
+                log_debug("Using cached WeChat access token (double-check)")
                 return self._access_token
-            
-            # Refresh the token
-            log_info("Refreshing WeChat access token")
+
+            if self._refresh_task is None:
+                log_info("Refreshing WeChat access token")
+                self._refresh_task = asyncio.create_task(self._run_refresh())
+            refresh_task = self._refresh_task
+
+        # The refresh runs in its own task and every caller, the one that started it included,
+        # waits through shield: cancelling a caller neither cancels the refresh nor changes
+        # the result the other callers get
+        return await asyncio.shield(refresh_task)
+
+    async def _run_refresh(self) -> Optional[str]:
+        """Body of the shared refresh task, clears the in-flight handle when it finishes."""
+        try:
             return await self._refresh_token()
+        finally:
+            self._refresh_task = None
 
     async def _refresh_token(self) -> Optional[str]:
         """
         Refresh the access token from WeChat API.
-        Should only be called while holding the refresh lock.
+        Should only be called from the shared refresh task, see _single_flight_refresh.
         """
-        if not self._appid or not self._secret:
-            log_error("WeChat APPID or SECRET not configured")
+        if self._config_broken:
             return None
         
-        url = (f"https://api.weixin.qq.com/cgi-bin/token?"
-               f"grant_type=client_credential&appid={self._appid}&secret={self._secret}")
-        
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url)
-                response.raise_for_status()
-                data = response.json()
+            client = await get_http_client()
+            response = await client.get(self._token_url)
+            response.raise_for_status()
+            data = json_loads(response.content)
+            
+            if "access_token" in data and "expires_in" in data:
+                self._access_token = data["access_token"]
+                expires_in = data["expires_in"]  # Usually 7200 seconds (2 hours)
+                self._token_expires_at = time.monotonic() + expires_in
+                self._info_cache_ts = 0
+                
+                log_info(f"WeChat access token refreshed successfully, expires in {expires_in} seconds")
+                self._schedule_background_refresh(expires_in)
+                return self._access_token
+            else:
+                error_code = data.get("errcode", "unknown")
+                error_msg = data.get("errmsg", "unknown error")
+                log_error(f"Failed to get WeChat access token: {error_code} - {error_msg}")
+                return None
                 
-                if "access_token" in data and "expires_in" in data:
-                    self._access_token = data["access_token"]
-                    expires_in = data["expires_in"]  # Usually 7200 seconds (2 hours)
-                    self._token_expires_at = time.time() + expires_in
-                    
-                    log_info(f"WeChat access token refreshed successfully, expires in {expires_in} seconds")
-                    return self._access_token
-                else:
-                    error_code = data.get("errcode", "unknown")
-                    error_msg = data.get("errmsg", "unknown error")
-                    log_error(f"Failed to get WeChat access token: {error_code} - {error_msg}")
-                    return None
-                    
         except httpx.TimeoutException:
             log_error("Timeout while refreshing WeChat access token")
             return None
@@ -125,6 +175,35 @@ class WeChatTokenManager:
             log_error(f"Unexpected error while refreshing WeChat access token: {e}")
             return None
 
+    def _schedule_background_refresh(self, expires_in: float):
+        """
+        Schedule a proactive refresh shortly before the token enters the refresh buffer,
+        so callers never wait on the token endpoint.
+        """
+        # Don't cancel the background task when it is the one waiting on this refresh
+        if (self._bg_task is not None and not self._bg_task.done() and
+                self._bg_task is not self._bg_refreshing_task):
+            self._bg_task.cancel()
+        
+        delay = expires_in - self._refresh_buffer_seconds - self._bg_refresh_margin_seconds
+        if delay <= 0:
+            self._bg_task = None
+            return
+        self._bg_task = asyncio.create_task(self._background_refresh(delay))
+
+    async def _background_refresh(self, delay: float):
+        """Sleep until the scheduled time, then refresh through the single-flight path."""
+        await asyncio.sleep(delay)
+        # From here on the task waits on a refresh, it is no longer cancelled when a new one is scheduled
+        current_task = asyncio.current_task()
+        self._bg_refreshing_task = current_task
+        try:
+            log_info("Proactively refreshing WeChat access token")
+            await self._single_flight_refresh(force=True)
+        finally:
+            if self._bg_refreshing_task is current_task:
+                self._bg_refreshing_task = None
+
     def invalidate_token(self):
         """
         Invalidate the current token, forcing a refresh on next access.
@@ -133,22 +212,38 @@ class WeChatTokenManager:
         log_warning("Invalidating WeChat access token")
         self._access_token = None
         self._token_expires_at = 0
+        self._info_cache_ts = 0
+        # Only cancel a background refresh that is still sleeping, one that is mid-refresh
+        # finishes and schedules the next refresh itself
+        if (self._bg_task is not None and not self._bg_task.done() and
+                self._bg_task is not self._bg_refreshing_task):
+            self._bg_task.cancel()
+            self._bg_task = None
 
     def get_token_info(self) -> dict:
         """
         Get information about the current token state.
         Useful for debugging and monitoring.
         """
-        current_time = time.time()
-        return {
+        current_time = time.monotonic()
+        # Serve the memoized result for frequent polling (e.g. health checks). Callers get a
+        # copy, so one that edits its result can't change what the others are served
+        if current_time - self._info_cache_ts < self._info_cache_ttl_seconds:
+            return dict(self._info_cache)
+        
+        self._info_cache = {
             "has_token": self._access_token is not None,
-            "expires_at": self._token_expires_at,
+            # Expiry is tracked on the monotonic clock, convert to wall-clock for display
+            "expires_at": (time.time() + (self._token_expires_at - current_time)
+                           if self._token_expires_at else 0),
             "expires_in_seconds": max(0, self._token_expires_at - current_time),
             "is_valid": (self._access_token is not None and 
                         current_time < self._token_expires_at),
             "needs_refresh": (self._access_token is None or 
                             current_time >= (self._token_expires_at - self._refresh_buffer_seconds))
         }
+        self._info_cache_ts = current_time
+        return dict(self._info_cache)
 
 
 # Global singleton instance and lock
@@ -6,10 +6,28 @@ Handles authentication, error handling, and retry logic.
 """
 
 import asyncio
+from functools import lru_cache
 from typing import Optional, Dict, Any, Union
 import httpx
 from ..logger.logger import log_info, log_error
 from ..auth.wechat_token_manager import get_token_manager
+from ..global_var.global_var import get_http_client
+from ..utils.utils import json_loads
+
+# WeChat errcodes meaning the access token is invalid or expired
+_TOKEN_ERROR_CODES: frozenset[int] = frozenset({40001, 40014, 42001})
+
+# HTTP methods supported by _make_request
+_VALID_METHODS: frozenset[str] = frozenset({"GET", "POST", "PUT", "DELETE"})
+
+# HTTP methods that send a JSON body
+_JSON_BODY_METHODS: frozenset[str] = frozenset({"POST", "PUT"})
+
+
+@lru_cache(maxsize=128)
+def _build_url(base_url: str, endpoint: str) -> str:
+    """Build the full API URL for an endpoint (cached per endpoint)"""
+    return f"{base_url}/{endpoint.lstrip('/')}"
 
 
 class WeChatAPIClient:
@@ -60,6 +78,14 @@ class WeChatAPIClient:
         """
         token_manager = await self._get_token_manager()
         
+        method_upper = method.upper()
+        if method_upper not in _VALID_METHODS:
+            log_error(f"Unsupported HTTP method: {method}")
+            return None
+        
+        # Build URL
+        url = _build_url(self.BASE_URL, endpoint)
+        
         # Try up to max_retries times in case of token expiry
         for attempt in range(self.max_retries):
             # Get access token if required
@@ -70,49 +96,42 @@ class WeChatAPIClient:
                     log_error(f"Cannot make {method} request to {endpoint}: no access token")
                     return None
             
-            # Build URL
-            url = f"{self.BASE_URL}/{endpoint.lstrip('/')}"
-            
-            # Add token to query params if required
-            request_params = params or {}
+            # Add token to query params if required (copy so the caller's dict is never mutated)
+            request_params = dict(params) if params else {}
             if require_token and access_token:
                 request_params["access_token"] = access_token
             
             try:
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    if method.upper() == "GET":
-                        response = await client.get(url, params=request_params)
-                    elif method.upper() == "POST":
-                        response = await client.post(url, params=request_params, json=data)
-                    elif method.upper() == "PUT":
-                        response = await client.put(url, params=request_params, json=data)
-                    elif method.upper() == "DELETE":
-                        response = await client.delete(url, params=request_params)
+                client = await get_http_client()
+                response = await client.request(
+                    method_upper,
+                    url,
+                    params=request_params,
+                    json=data if method_upper in _JSON_BODY_METHODS else None,
+                    timeout=self.timeout
+                )
+                
+                response.raise_for_status()
+                result = json_loads(response.content)
+                
+                # Check WeChat API response
+                if result.get("errcode") == 0 or "errcode" not in result:
+                    log_info(f"Successfully made {method} request to {endpoint}")
+                    return result
+                elif require_token and result.get("errcode") in _TOKEN_ERROR_CODES:
+                    # Token expired or invalid - invalidate and retry
+                    log_error(f"WeChat API token error: {result}")
+                    token_manager.invalidate_token()
+                    if attempt < self.max_retries - 1:
+                        log_info("Retrying with refreshed token...")
+                        continue
                     else:
-                        log_error(f"Unsupported HTTP method: {method}")
+                        log_error(f"Failed to make {method} request after token refresh")
                         return None
+                else:
+                    log_error(f"WeChat API error: {result}")
+                    return None
                     
-                    response.raise_for_status()
-                    result = response.json()
-                    
-                    # Check WeChat API response
-                    if result.get("errcode") == 0 or "errcode" not in result:
-                        log_info(f"Successfully made {method} request to {endpoint}")
-                        return result
-                    elif require_token and result.get("errcode") in [40001, 40014, 42001]:
-                        # Token expired or invalid - invalidate and retry
-                        log_error(f"WeChat API token error: {result}")
-                        token_manager.invalidate_token()
-                        if attempt < self.max_retries - 1:
-                            log_info("Retrying with refreshed token...")
-                            continue
-                        else:
-                            log_error(f"Failed to make {method} request after token refresh")
-                            return None
-                    else:
-                        log_error(f"WeChat API error: {result}")
-                        return None
-                        
             except httpx.TimeoutException:
                 log_error(f"Timeout while making {method} request to {endpoint}")
                 return None
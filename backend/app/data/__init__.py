@@ -5,10 +5,17 @@ Provides unified data reading interface, supports local markdown files and futur
 
 import os
 import asyncio
-from typing import Dict, Optional
+from typing import Dict, Mapping, Optional, Tuple
 from pathlib import Path
+from types import MappingProxyType
 import aiofiles
-from ..logger.logger import log_error, log_info, log_warn
+from ..logger.logger import log_debug, log_error, log_info, log_warn
+
+# Maximum number of markdown files read concurrently during async preload
+MAX_CONCURRENT_READS = 5
+
+# Default app/data/markdown path, resolved once relative to this file
+_DEFAULT_DATA_DIR = Path(__file__).resolve().parent / "markdown"
 
 class DataAccessLayer:
     """
@@ -24,15 +31,13 @@ class DataAccessLayer:
             data_dir: Data directory path, defaults to app/data/markdown
         """
         if data_dir is None:
-            # Get the app/data/markdown path relative to current file directory
-            current_dir = Path(__file__).parent.parent
-            self.data_dir = current_dir / "data" / "markdown"
+            self.data_dir = _DEFAULT_DATA_DIR
         else:
             self.data_dir = Path(data_dir)
         
-        # Content cache
-        self._cache: Dict[str, str] = {}
-        self._cache_lock = asyncio.Lock()
+        # Content cache of (file mtime, content) per content type. The mapping is immutable and
+        # replaced as a whole on every update, so readers never need a lock
+        self._cache: Mapping[str, Tuple[float, str]] = MappingProxyType({})
         
         log_info(f"DataAccessLayer initialized with data_dir: {self.data_dir}")
     
@@ -47,27 +52,46 @@ class DataAccessLayer:
         Returns:
             Content string, returns None if file doesn't exist
         """
-        try:
-            # Check cache
-            if use_cache and content_type in self._cache:
-                # log_info(f"Returning cached content for {content_type}")
-                return self._cache[content_type]
-            
-            # Build file path
-            file_path = self.data_dir / f"{content_type}.md"
-            
-            if not file_path.exists():
+        # Build file path
+        file_path = self.data_dir / f"{content_type}.md"
+        
+        if use_cache:
+            # A warm read is one stat and a dict lookup, the file is only re-read when it changed
+            try:
+                mtime = os.stat(file_path).st_mtime
+            except OSError:
                 log_warn(f"Content file not found: {file_path}")
                 return None
+            cached = self._cache.get(content_type)
+            if cached is not None and cached[0] == mtime:
+                # Cache hits are the common case, keep them out of INFO logs
+                log_debug(f"[DataAccessLayer] Returning cached content for {content_type}")
+                return cached[1]
+            content = await self._read_file(file_path, content_type)
+            if content is not None:
+                self._cache = MappingProxyType({**self._cache, content_type: (mtime, content)})
+            return content
+        
+        if not file_path.exists():
+            log_warn(f"Content file not found: {file_path}")
+            return None
+        # Read file content asynchronously, bypassing the cache
+        return await self._read_file(file_path, content_type)
+    
+    async def _read_file(self, file_path: Path, content_type: str) -> Optional[str]:
+        """
+        Read a markdown file asynchronously
+        
+        Args:
+            file_path: Markdown file path
+            content_type: Content type, only used for logging
             
-            # Read file content asynchronously
+        Returns:
+            Content string, returns None if the file can't be read
+        """
+        try:
             async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
                 content = await f.read()
-            
-            # Update cache
-            if use_cache:
-                async with self._cache_lock:
-                    self._cache[content_type] = content
 
             log_info(f"[DataAccessLayer] Successfully loaded content for {content_type}")
             return content
@@ -76,38 +100,48 @@ class DataAccessLayer:
             log_error(f"[DataAccessLayer] Error loading content for {content_type}: {str(e)}")
             return None
     
-    async def refresh_cache(self, content_type: str = None):
+    async def _load_one(self, content_type: str, sem: asyncio.Semaphore,
+                        contents: Dict[str, Tuple[float, str]]):
         """
-        Refresh cache
-        
-        Args:
-            content_type: Specific content type to refresh, None means refresh all cache
+        Load a single content file into the local contents dict, bounded by the semaphore
         """
-        async with self._cache_lock:
-            if content_type:
-                # Refresh cache for specific type
-                if content_type in self._cache:
-                    del self._cache[content_type]
-                    log_info(f"[DataAccessLayer] Cache refreshed for {content_type}")
-            else:
-                # Clear all cache
-                self._cache.clear()
-                log_info("[DataAccessLayer] All cache cleared")
-
+        try:
+            mtime = os.stat(self.data_dir / f"{content_type}.md").st_mtime
+        except OSError:
+            return
+        async with sem:
+            content = await self.get_content(content_type, use_cache=False)
+        if content is not None:
+            contents[content_type] = (mtime, content)
+    
     async def preload_all_content(self):
         """
-        Preload all content to cache
+        Preload all content to cache without blocking the event loop
         """
-        content_types = ['brand', 'pricing', 'styles', 'purchase', 'other']
+        content_types = self.get_available_content_types()
         
-        tasks = []
-        for content_type in content_types:
-            tasks.append(self.get_content(content_type, use_cache=True))
+        # Bound concurrent file reads so aiofiles doesn't oversubscribe its thread pool
+        sem = asyncio.Semaphore(MAX_CONCURRENT_READS)
+        contents: Dict[str, Tuple[float, str]] = {}
+        async with asyncio.TaskGroup() as tg:
+            for content_type in content_types:
+                tg.create_task(self._load_one(content_type, sem, contents))
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # Publish all results at once instead of one cache write per file. This is a single
+        # attribute assignment, so no lock is needed; concurrent refreshes may read the same
+        # files twice, which is harmless since the content is idempotent
+        self._cache = MappingProxyType(contents)
+        log_info(f"[DataAccessLayer] Preloaded {len(contents)}/{len(content_types)} content files")
+    
+    async def refresh_cache(self, content_type: str = None):
+        """
+        Refresh cache
         
-        loaded_count = sum(1 for result in results if isinstance(result, str))
-        log_info(f"[DataAccessLayer] Preloaded {loaded_count}/{len(content_types)} content files")
+        Args:
+            content_type: Kept for compatibility, the whole cache is always reloaded
+        """
+        await self.preload_all_content()
+        log_info(f"[DataAccessLayer] Cache refreshed for {content_type or 'all content'}")
 
     def get_available_content_types(self) -> list:
         """
@@ -116,18 +150,25 @@ class DataAccessLayer:
         Returns:
             List of available content types
         """
-        if not self.data_dir.exists():
+        # scandir yields entries with cached type info, and a missing directory
+        # is handled by the exception instead of an extra exists() call
+        try:
+            with os.scandir(self.data_dir) as entries:
+                return sorted(entry.name[:-3] for entry in entries
+                              if entry.name.endswith('.md') and entry.is_file())
+        except FileNotFoundError:
             return []
-        
-        content_types = []
-        for file_path in self.data_dir.glob("*.md"):
-            content_types.append(file_path.stem)
-        
-        return sorted(content_types)
 
 # Global data access layer instance
 _data_access_layer = None
-_dal_lock = asyncio.Lock()
+_dal_lock: Optional[asyncio.Lock] = None
+
+def _get_dal_lock() -> asyncio.Lock:
+    """Get or create the data access layer lock (lazy initialization)"""
+    global _dal_lock
+    if _dal_lock is None:
+        _dal_lock = asyncio.Lock()
+    return _dal_lock
 
 async def get_data_access_layer() -> DataAccessLayer:
     """
@@ -139,10 +180,10 @@ async def get_data_access_layer() -> DataAccessLayer:
     global _data_access_layer
     
     if _data_access_layer is None:
-        async with _dal_lock:
+        async with _get_dal_lock():
             if _data_access_layer is None:
                 _data_access_layer = DataAccessLayer()
-                # Preload content
+                # Preload content, the reads run off the event loop
                 await _data_access_layer.preload_all_content()
     
     return _data_access_layer
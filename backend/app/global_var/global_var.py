@@ -1,14 +1,121 @@
+import asyncio
+import importlib.util
 import os
+import threading
 
-from concurrent.futures import ThreadPoolExecutor
-from math import ceil
+from typing import Optional, Tuple
 
-# For two vCores, it will create 6 threads.
-_THREAD_IO_RATIO = 0.65
-_CPU_COUNT = os.cpu_count() or 1
-_THREAD_COUNT = ceil(_CPU_COUNT / (1 - _THREAD_IO_RATIO))
-_global_executor = ThreadPoolExecutor(_THREAD_COUNT)
+import httpx
 
+from ..utils.utils import load_config
 
-def global_executor() -> ThreadPoolExecutor:
-    return _global_executor
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional, shared state then stays in process memory
+    aioredis = None
+
+
+# httpx needs the optional h2 package (httpx[http2]) for HTTP/2 support
+_HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+# Shared HTTP client so outbound calls reuse keep-alive TCP/TLS connections
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_lock: Optional[asyncio.Lock] = None
+
+def _get_http_client_lock() -> asyncio.Lock:
+    """Get or create the http client lock (lazy initialization)"""
+    global _http_client_lock
+    if _http_client_lock is None:
+        _http_client_lock = asyncio.Lock()
+    return _http_client_lock
+
+async def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the global httpx.AsyncClient instance.
+    Creates it if it doesn't exist (singleton pattern).
+    Async-safe to prevent multiple instances being created.
+    """
+    global _http_client
+
+    # Fast path: if already created, return immediately
+    if _http_client is not None:
+        return _http_client
+
+    # Slow path: need to create instance with lock protection
+    client_lock = _get_http_client_lock()
+    async with client_lock:
+        # Double-check pattern: another coroutine might have created it
+        if _http_client is None:
+            _http_client = httpx.AsyncClient(
+                # HTTP/2 multiplexes concurrent WeChat API calls over one connection
+                http2=_HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                timeout=httpx.Timeout(30.0, connect=10.0),
+            )
+        return _http_client
+
+async def close_http_client() -> None:
+    """Close the global httpx.AsyncClient, called on app shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# Pooled clients handed to the OpenAI SDK so LLM calls reuse keep-alive TLS connections.
+# The async client serves astream/ainvoke. The agent is never invoked synchronously, the sync
+# client only replaces the one the SDK would otherwise build on its own.
+# The read timeout applies per streamed chunk, not to the whole completion
+_LLM_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+_LLM_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+_llm_http_clients: Optional[Tuple[httpx.Client, httpx.AsyncClient]] = None
+_llm_http_clients_lock = threading.Lock()
+
+
+def llm_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Get the (sync, async) httpx clients used for Azure OpenAI calls.
+    Created on first use, the chat model is built outside of any event loop.
+    """
+    global _llm_http_clients
+    if _llm_http_clients is None:
+        with _llm_http_clients_lock:
+            if _llm_http_clients is None:
+                _llm_http_clients = (
+                    httpx.Client(http2=_HTTP2_AVAILABLE, limits=_LLM_HTTP_LIMITS, timeout=_LLM_HTTP_TIMEOUT),
+                    httpx.AsyncClient(http2=_HTTP2_AVAILABLE, limits=_LLM_HTTP_LIMITS, timeout=_LLM_HTTP_TIMEOUT),
+                )
+    return _llm_http_clients
+
+async def close_llm_http_clients() -> None:
+    """Close the Azure OpenAI httpx clients, called on app shutdown."""
+    global _llm_http_clients
+    if _llm_http_clients is not None:
+        sync_client, async_client = _llm_http_clients
+        _llm_http_clients = None
+        sync_client.close()
+        await async_client.aclose()
+
+
+# Redis holds state that must be shared by all workers and survive restarts.
+# The REDIS_URL environment variable takes precedence over [redis] url in config.ini
+_REDIS_URL = os.getenv('REDIS_URL') or load_config().get('redis', 'url', fallback='')
+_redis_client = None
+
+
+def get_redis_client():
+    """
+    Get the global redis.asyncio.Redis client, or None when Redis is not configured
+    or the redis package is not installed. The client connects lazily on first command.
+    """
+    global _redis_client
+    if _redis_client is None and _REDIS_URL and aioredis is not None:
+        _redis_client = aioredis.from_url(_REDIS_URL)
+    return _redis_client
+
+async def close_redis_client() -> None:
+    """Close the global Redis client, called on app shutdown."""
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
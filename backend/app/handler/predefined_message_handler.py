@@ -2,11 +2,16 @@
 Predefined message handler for WeChat bot.
 Handles simple greetings, thanks, and other predefined responses.
 """
-import asyncio
-import configparser
-import os
-from typing import Optional, Tuple
+import re
+from typing import Dict, Optional, Tuple
 from ..logger.logger import log_info
+from ..utils.utils import load_config
+
+# Matches any CJK unified ideograph, scanned in C instead of a per-char Python loop
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+
+# Exact-match stats phrases. They are all CJK, so input needs no case folding before lookup
+_STATS_PHRASES = frozenset(["剩余次数", "查询次数", "还有几次", "次数"])
 
 class PredefinedMessageHandler:
     """
@@ -16,10 +21,8 @@ class PredefinedMessageHandler:
     
     def __init__(self):
         # Load configuration
-        config = configparser.ConfigParser()
-        config_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.ini')
-        if config.read(config_path, encoding='utf-8') and config.has_section('wechat'):
+        config = load_config()
+        if config.has_section('wechat'):
             self.daily_limit = config.getint('wechat', 'daily_limit', fallback=5)
         else:
             self.daily_limit = 5
@@ -28,7 +31,36 @@ class PredefinedMessageHandler:
         self.greeting_response = "你好！我是悦华珍珠AI助手宝儿，可以回答你任何和珍珠相关的问题。关于珍珠的品种、鉴别、历史、佩戴、护理等，如果你有任何疑问，欢迎随时提问！"
         self.thanks_response = "不客气！很高兴能为您解答。如果您以后还有任何关于珍珠的问题，随时欢迎来咨询我。祝您生活愉快！"
         self.subscribe_response_template = "Hi，感谢订阅沛珠记，成为我们大家庭的一员。我是AI珍珠专家宝儿，你可以向我咨询任何珍珠相关问题，我会努力回答！\n\n💡 温馨提示：每天您有{daily_limit}次对话机会，今日剩余{remaining}次。"
+        # Formatted subscribe messages by remaining count, there are at most daily_limit + 1 of them
+        self._subscribe_responses: Dict[int, str] = {}
         self.stats_response_template = "📊 今日对话统计：\n已使用：{used}次\n剩余：{remaining}次\n总计：{daily_limit}次/天"
+        
+        # Define greeting keywords
+        greeting_keywords = [
+            "你好", "您好", "hello", "hi", "嗨", "哈喽", 
+            "早上好", "下午好", "晚上好", "晚安",
+            "在吗", "在不在", "在线吗",
+            "hey", "嘿"
+        ]
+        
+        # Define thanks keywords
+        thanks_keywords = [
+            "谢谢", "谢了", "感谢", "多谢", "谢谢你", "谢谢您",
+            "感谢你", "感谢您", "非常感谢", "十分感谢",
+            "thanks", "thank you", "thx", "ty", "thks",
+            "谢", "谢啦", "辛苦了", "辛苦", "赞", "cool",
+            "棒", "好的", "ok", "okay"
+        ]
+        
+        # Compile each keyword set into one alternation so a message is scanned once
+        self._greeting_re = re.compile('|'.join(map(re.escape, greeting_keywords)))
+        self._thanks_re = re.compile('|'.join(map(re.escape, thanks_keywords)))
+        # Both sets in one pattern, matched once at the start of the text: the first branch
+        # finds a greeting anywhere, the second a thanks keyword anywhere, so greetings keep
+        # precedence and m.lastgroup names the bucket
+        self._keyword_re = re.compile(
+            '(?=.*?(?P<greeting>' + self._greeting_re.pattern + '))'
+            '|(?=.*?(?P<thanks>' + self._thanks_re.pattern + '))', re.S)
     
     def is_simple_greeting(self, text: str) -> bool:
         """
@@ -52,20 +84,8 @@ class PredefinedMessageHandler:
         if len(cleaned_text) > MAX_GREETING_LENGTH:
             return False
         
-        # Define greeting keywords
-        greeting_keywords = [
-            "你好", "您好", "hello", "hi", "嗨", "哈喽", 
-            "早上好", "下午好", "晚上好", "晚安",
-            "在吗", "在不在", "在线吗",
-            "hey", "嘿"
-        ]
-        
         # Check if any greeting keyword is contained in the text
-        for keyword in greeting_keywords:
-            if keyword in cleaned_text:
-                return True
-        
-        return False
+        return self._greeting_re.search(cleaned_text) is not None
     
     def is_simple_thanks(self, text: str) -> bool:
         """
@@ -84,29 +104,16 @@ class PredefinedMessageHandler:
         # Clean and normalize the text
         cleaned_text = text.strip().lower()
         
-        # Check if text contains Chinese characters
-        has_chinese = any('\u4e00' <= char <= '\u9fff' for char in cleaned_text)
-        
-        # Set different length limits for Chinese and English
-        MAX_THANKS_LENGTH = 6 if has_chinese else 10
-        if len(cleaned_text) > MAX_THANKS_LENGTH:
+        # Different length limits for Chinese (6) and English (10). Check the length
+        # first, the Chinese character scan only matters for 7-10 characters
+        text_length = len(cleaned_text)
+        if text_length > 10:
+            return False
+        if text_length > 6 and _CJK_RE.search(cleaned_text) is not None:
             return False
-        
-        # Define thanks keywords
-        thanks_keywords = [
-            "谢谢", "谢了", "感谢", "多谢", "谢谢你", "谢谢您",
-            "感谢你", "感谢您", "非常感谢", "十分感谢",
-            "thanks", "thank you", "thx", "ty", "thks",
-            "谢", "谢啦", "辛苦了", "辛苦", "赞", "cool",
-            "棒", "好的", "ok", "okay"
-        ]
         
         # Check if any thanks keyword is contained in the text
-        for keyword in thanks_keywords:
-            if keyword in cleaned_text:
-                return True
-        
-        return False
+        return self._thanks_re.search(cleaned_text) is not None
     
     def is_stats_query(self, text: str) -> bool:
         """
@@ -121,7 +128,37 @@ class PredefinedMessageHandler:
         if not text:
             return False
         
-        return text.strip().lower() in ["剩余次数", "查询次数", "还有几次", "次数"]
+        return text.strip() in _STATS_PHRASES
+    
+    def classify_message(self, text: str) -> Optional[str]:
+        """
+        Classify the text as a simple greeting or thanks with a single keyword scan.
+        Equivalent to is_simple_greeting() followed by is_simple_thanks().
+        
+        Args:
+            text: User input text
+            
+        Returns:
+            "greeting", "thanks", or None if neither applies
+        """
+        if not text:
+            return None
+        
+        cleaned_text = text.strip().lower()
+        text_length = len(cleaned_text)
+        
+        # Longer than every length limit, skip the keyword scan
+        if text_length > 10:
+            return None
+        
+        if text_length <= 6:
+            match = self._keyword_re.match(cleaned_text)
+            return match.lastgroup if match else None
+        
+        # 7-10 characters is only allowed for non-Chinese thanks
+        if _CJK_RE.search(cleaned_text) is None and self._thanks_re.search(cleaned_text) is not None:
+            return "thanks"
+        return None
     
     def handle_predefined_message(self, text: str, user_id: str, remaining_conversations: int) -> Optional[Tuple[str, str]]:
         """
@@ -144,11 +181,12 @@ class PredefinedMessageHandler:
             )
             return response, "stats"
         
-        elif self.is_simple_greeting(text):
+        message_type = self.classify_message(text)
+        if message_type == "greeting":
             # log_info(f"Responded to greeting from {user_id} with predefined message")
             return self.greeting_response, "greeting"
         
-        elif self.is_simple_thanks(text):
+        elif message_type == "thanks":
             # log_info(f"Responded to thanks from {user_id} with predefined message")
             return self.thanks_response, "thanks"
         
@@ -164,10 +202,14 @@ class PredefinedMessageHandler:
         Returns:
             Subscribe welcome message
         """
-        return self.subscribe_response_template.format(
-            daily_limit=self.daily_limit,
-            remaining=remaining_conversations
-        )
+        response = self._subscribe_responses.get(remaining_conversations)
+        if response is None:
+            response = self._subscribe_responses[remaining_conversations] = \
+                self.subscribe_response_template.format(
+                    daily_limit=self.daily_limit,
+                    remaining=remaining_conversations
+                )
+        return response
     
     def add_greeting_keyword(self, keyword: str):
         """
@@ -192,27 +234,5 @@ class PredefinedMessageHandler:
         pass
 
 
-# Global instance for easy access
-_predefined_handler = None
-_handler_lock = asyncio.Lock()
-
-async def get_predefined_handler() -> PredefinedMessageHandler:
-    """
-    Get the singleton predefined message handler with thread/async safety.
-    Uses double-checked locking pattern for optimal performance.
-    
-    Returns:
-        PredefinedMessageHandler instance
-    """
-    global _predefined_handler
-    
-    # First check without lock for performance (most common case)
-    if _predefined_handler is not None:
-        return _predefined_handler
-    
-    # Double-checked locking to ensure thread safety
-    async with _handler_lock:
-        if _predefined_handler is None:
-            _predefined_handler = PredefinedMessageHandler()
-    
-    return _predefined_handler
+# Global instance for easy access, built eagerly since construction only reads the cached config
+predefined_handler = PredefinedMessageHandler()
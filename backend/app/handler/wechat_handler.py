@@ -1,146 +1,193 @@
 import asyncio
+from collections import deque
+from cachetools import TTLCache
 from fastapi import Request, BackgroundTasks
 from fastapi.responses import PlainTextResponse, Response
 import time
 import hashlib
+import hmac
+import traceback
 import xml.etree.ElementTree as ET
-import configparser
-import os
-from collections import defaultdict
-from datetime import datetime
+import weakref
 
 from ..logger.logger import userqa_logger, log_error, log_info
 from ..pearl_agent import PearlAIAgent
 from ..auth.wechat_token_manager import get_token_manager
 from ..client.wechat_client import get_wechat_client
-from .predefined_message_handler import get_predefined_handler
-
-# Read wechat token from config.ini
-config = configparser.ConfigParser()
-config_path = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.ini')
-if not config.read(config_path, encoding='utf-8'):
-    raise RuntimeError(f'Config file not found: {config_path}')
+from ..global_var.global_var import get_redis_client
+from ..utils.utils import CONFIG_PATH, load_config
+from .predefined_message_handler import predefined_handler
+
+# Read wechat token from config.ini, the parsed file is shared through utils.load_config
+config = load_config()
 if not config.has_section('wechat'):
-    raise RuntimeError(f'[wechat] section not found in {config_path}')
+    raise RuntimeError(f'[wechat] section not found in {CONFIG_PATH}')
 
 WECHAT_TOKEN = config.get('wechat', 'token')
+_WECHAT_TOKEN_BYTES = WECHAT_TOKEN.encode('utf-8')
 
 # Get daily conversation limit from config, default to 5
 DAILY_CONVERSATION_LIMIT = config.getint('wechat', 'daily_limit', fallback=5)
 
 
-# In-memory chat history, Redis/DB is recommended for production
-chat_history_dict = {}
-user_locks = defaultdict(asyncio.Lock)
+# Fields read from inbound WeChat XML, all direct children of the <xml> root
+_WECHAT_FIELDS = ("MsgType", "FromUserName", "ToUserName", "Content", "Event", "CreateTime")
+
+# Azure OpenAI content filter rejection, answered with a fixed reply instead of an error
+_POLICY_VIOLATION_MARKER = 'ResponsibleAIPolicyViolation'
+POLICY_VIOLATION_REPLY = "抱歉，我是一名AI珍珠专家，我不能做回答珍珠相关问题的其他操作"
+
+# Static segments of the text reply XML, only the user names, timestamp and content vary
+_REPLY_HEAD = b"<xml><ToUserName><![CDATA["
+_REPLY_FROM = b"]]></ToUserName><FromUserName><![CDATA["
+_REPLY_CREATE_TIME = b"]]></FromUserName><CreateTime>"
+_REPLY_CONTENT = b"</CreateTime><MsgType><![CDATA[text]]></MsgType><Content><![CDATA["
+_REPLY_TAIL = b"]]></Content></xml>"
+
+# Per-user locks are held weakly, so a lock is garbage collected once no coroutine holds or waits on it
+def _get_user_lock(locks: weakref.WeakValueDictionary, user_id: str) -> asyncio.Lock:
+    lock = locks.get(user_id)
+    if lock is None:
+        lock = locks[user_id] = asyncio.Lock()
+    return lock
+
 
-# Daily conversation limit tracking with thread safety
+# In-memory chat history, Redis/DB is recommended for production.
+# Bounded by size and idle time so inactive users don't accumulate forever
+CHAT_HISTORY_MAX_USERS = 50000
+CHAT_HISTORY_TTL_SECONDS = 3600
+chat_history_dict = TTLCache(maxsize=CHAT_HISTORY_MAX_USERS, ttl=CHAT_HISTORY_TTL_SECONDS)
+# Each user's history is a bounded deque, the oldest messages drop off on append
+CHAT_HISTORY_MAX_MESSAGES = 20
+user_locks = weakref.WeakValueDictionary()
+
+# Daily conversation limit tracking with thread safety, used when Redis is not configured
 # Format: {user_id: {"date": "2025-07-03", "count": 3}}
+# Not size-bounded, evicting a live counter would hand that user a fresh quota. Instead the
+# map only ever holds one day's users: it is emptied on the first access after midnight
 user_daily_count = {}
-user_count_locks = defaultdict(asyncio.Lock)
+_user_daily_count_date = ""
+user_count_locks = weakref.WeakValueDictionary()
+
+# With Redis the counter is one key per user and day, kept a little over a day so it
+# outlives any timezone offset between workers before expiring
+_QUOTA_KEY_PREFIX = "gz:quota:"
+_QUOTA_KEY_TTL_SECONDS = 2 * 24 * 3600
+
+def _quota_key(user_id: str) -> str:
+    return f"{_QUOTA_KEY_PREFIX}{user_id}:{_today()}"
+
+# Cached local date string, recomputed only after midnight
+_DATE_FORMAT = "%Y-%m-%d"
+_today_str = ""
+_today_expires = 0.0
+
+def _today() -> str:
+    """Return today's local date as YYYY-MM-DD, cached until the next midnight"""
+    global _today_str, _today_expires
+    now = time.time()
+    if now >= _today_expires:
+        local_now = time.localtime(now)
+        _today_str = time.strftime(_DATE_FORMAT, local_now)
+        # mktime normalizes tm_mday + 1 across month/year boundaries
+        _today_expires = time.mktime((local_now.tm_year, local_now.tm_mon, local_now.tm_mday + 1,
+                                      0, 0, 0, 0, 0, -1))
+    return _today_str
+
+def _daily_counts(today: str) -> dict:
+    """Return the in-memory daily counters, dropping earlier days' entries after midnight"""
+    global _user_daily_count_date
+    if today != _user_daily_count_date:
+        # Entries are only created with the current date, so every entry here is stale
+        user_daily_count.clear()
+        _user_daily_count_date = today
+    return user_daily_count
 
 class WeChatHandler:
     agent = PearlAIAgent()
 
     @classmethod
-    async def check_daily_limit(cls, user_id):
-        """Check if user has exceeded daily conversation limit (thread-safe)"""
-        async with user_count_locks[user_id]:
-            today = datetime.now().strftime("%Y-%m-%d")
-            
-            if user_id not in user_daily_count:
-                user_daily_count[user_id] = {"date": today, "count": 0}
-                return True
-            
-            user_data = user_daily_count[user_id]
-            
-            # Reset count if it's a new day
-            if user_data["date"] != today:
-                user_daily_count[user_id] = {"date": today, "count": 0}
-                return True
-            
-            # Check if user has exceeded limit
-            return user_data["count"] < DAILY_CONVERSATION_LIMIT
-    
-    @classmethod
-    async def increment_daily_count(cls, user_id):
-        """Increment user's daily conversation count (thread-safe)"""
-        async with user_count_locks[user_id]:
-            today = datetime.now().strftime("%Y-%m-%d")
-            
-            if user_id not in user_daily_count:
-                user_daily_count[user_id] = {"date": today, "count": 1}
-            else:
-                user_data = user_daily_count[user_id]
-                if user_data["date"] == today:
-                    user_daily_count[user_id]["count"] += 1
-                else:
-                    user_daily_count[user_id] = {"date": today, "count": 1}
-    
-    @classmethod
-    async def check_and_increment_daily_count(cls, user_id):
-        """Check limit and increment count atomically (thread-safe)"""
-        async with user_count_locks[user_id]:
-            today = datetime.now().strftime("%Y-%m-%d")
-            
-            # Initialize if not exists
-            if user_id not in user_daily_count:
-                user_daily_count[user_id] = {"date": today, "count": 0}
-            
-            user_data = user_daily_count[user_id]
+    async def reserve_conversation(cls, user_id):
+        """
+        Check the daily limit and reserve one conversation atomically (thread-safe).
+        
+        Returns:
+            Tuple of (allowed, used, remaining)
+        """
+        redis_client = get_redis_client()
+        if redis_client is not None:
+            try:
+                # INCR is atomic across workers, so no lock is needed. The key is built once,
+                # so INCR and EXPIRE hit the same day's key even across midnight
+                quota_key = _quota_key(user_id)
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    pipe.incr(quota_key)
+                    pipe.expire(quota_key, _QUOTA_KEY_TTL_SECONDS)
+                    used, _ = await pipe.execute()
+                if used > DAILY_CONVERSATION_LIMIT:
+                    return False, DAILY_CONVERSATION_LIMIT, 0
+                return True, used, DAILY_CONVERSATION_LIMIT - used
+            except Exception as e:
+                log_error(f"Redis daily count failed for {user_id}, using in-memory count: {e}")
+
+        async with _get_user_lock(user_count_locks, user_id):
+            today = _today()
+            daily_counts = _daily_counts(today)
             
-            # Reset count if it's a new day
-            if user_data["date"] != today:
-                user_daily_count[user_id] = {"date": today, "count": 0}
-                user_data = user_daily_count[user_id]
+            user_data = daily_counts.get(user_id)
+            # Initialize if not exists, reset count if it's a new day
+            if user_data is None or user_data["date"] != today:
+                user_data = daily_counts[user_id] = {"date": today, "count": 0}
             
             # Check if user has exceeded limit
             if user_data["count"] >= DAILY_CONVERSATION_LIMIT:
-                return False, user_data["count"]
+                return False, user_data["count"], 0
             
             # Increment count
-            user_daily_count[user_id]["count"] += 1
-            return True, user_daily_count[user_id]["count"]
+            user_data["count"] += 1
+            used = user_data["count"]
+            return True, used, DAILY_CONVERSATION_LIMIT - used
     
     @classmethod
     async def get_remaining_conversations(cls, user_id):
         """Get remaining conversations for today (thread-safe)"""
-        async with user_count_locks[user_id]:
-            today = datetime.now().strftime("%Y-%m-%d")
+        redis_client = get_redis_client()
+        if redis_client is not None:
+            try:
+                used = int(await redis_client.get(_quota_key(user_id)) or 0)
+                return max(0, DAILY_CONVERSATION_LIMIT - used)
+            except Exception as e:
+                log_error(f"Redis daily count failed for {user_id}, using in-memory count: {e}")
+
+        async with _get_user_lock(user_count_locks, user_id):
+            today = _today()
             
-            if user_id not in user_daily_count or user_daily_count[user_id]["date"] != today:
+            user_data = _daily_counts(today).get(user_id)
+            if user_data is None or user_data["date"] != today:
                 return DAILY_CONVERSATION_LIMIT
             
-            used = user_daily_count[user_id]["count"]
+            used = user_data["count"]
             return max(0, DAILY_CONVERSATION_LIMIT - used)
 
     @staticmethod
     def build_wechat_text_reply(to_user, from_user, content):
-        """构建微信文本回复XML"""
-        now = int(time.time())
-        return f"""<xml>
-  <ToUserName><![CDATA[{to_user}]]></ToUserName>
-  <FromUserName><![CDATA[{from_user}]]></FromUserName>
-  <CreateTime>{now}</CreateTime>
-  <MsgType><![CDATA[text]]></MsgType>
-  <Content><![CDATA[{content}]]></Content>
-</xml>"""
+        """构建微信文本回复XML, returned as UTF-8 bytes ready for the response body"""
+        return b"".join((
+            _REPLY_HEAD, to_user.encode('utf-8'),
+            _REPLY_FROM, from_user.encode('utf-8'),
+            _REPLY_CREATE_TIME, str(int(time.time())).encode('ascii'),
+            _REPLY_CONTENT, content.encode('utf-8'),
+            _REPLY_TAIL,
+        ))
 
     @staticmethod
     def parse_wechat_message(xml_data):
         """parse WeChat XML message into a dictionary"""
         try:
-            if isinstance(xml_data, bytes):
-                xml_data = xml_data.decode('utf-8')
-            xml = ET.fromstring(xml_data)
-            return {
-                "MsgType": xml.findtext("MsgType"),
-                "FromUserName": xml.findtext("FromUserName"), 
-                "ToUserName": xml.findtext("ToUserName"),
-                "Content": xml.findtext("Content"),
-                "Event": xml.findtext("Event"),
-                "CreateTime": xml.findtext("CreateTime")
-            }
+            # expat decodes the raw request bytes itself, so entities, character references
+            # and split CDATA sections come back exactly as WeChat sent them
+            root = ET.fromstring(xml_data)
+            return {field: root.findtext(field) for field in _WECHAT_FIELDS}
         except Exception as e:
             log_error(f"Failed to parse WeChat message: {e}")
             return None
@@ -154,36 +201,31 @@ class WeChatHandler:
 
     @classmethod
     async def wechat_check(cls, signature: str, timestamp: str, nonce: str, echostr: str):
-        check_list = [WECHAT_TOKEN, timestamp, nonce]
-        check_list.sort()
-        check_str = ''.join(check_list)
-        hashcode = hashlib.sha1(check_str.encode('utf-8')).hexdigest()
-        if hashcode == signature:
+        # Feed the sorted parts straight into sha1 instead of joining then encoding
+        parts = sorted((_WECHAT_TOKEN_BYTES, timestamp.encode('utf-8'), nonce.encode('utf-8')))
+        sha1 = hashlib.sha1()
+        for part in parts:
+            sha1.update(part)
+        # Constant-time comparison avoids leaking the signature through timing
+        if hmac.compare_digest(sha1.hexdigest().encode('ascii'), signature.encode('utf-8')):
             return PlainTextResponse(echostr)
         return PlainTextResponse("signature error", status_code=403)
 
     @classmethod
     async def _safe_agent_answer(cls, question, user_id, chat_history):
         try:
-            # run the agent.answer method in a thread pool to avoid blocking the event loop
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, cls.agent.answer, question, chat_history)
+            # Run the agent on the event loop, WeChat needs the whole reply for its XML.
+            # The agent gets a list snapshot, the deque stays private to the handler
+            return await cls.agent.aanswer(question, list(chat_history))
         except Exception as e:
-            import traceback
             msg = str(e)
-            if hasattr(e, 'status_code') and e.status_code == 400:
-                if hasattr(e, 'body') and 'ResponsibleAIPolicyViolation' in str(e.body):
-                    return "抱歉，我是一名AI珍珠专家，我不能做回答珍珠相关问题的其他操作"
-                elif 'ResponsibleAIPolicyViolation' in msg:
-                    return "抱歉，我是一名AI珍珠专家，我不能做回答珍珠相关问题的其他操作"
-                else:
-                    log_error(f"OpenAI API error: {msg}\n{traceback.format_exc()}")
-                    return "抱歉，我出了点问题，目前无法处理您的请求，请稍后再试吧。"
-            elif 'ResponsibleAIPolicyViolation' in msg:
-                return "抱歉，我是一名AI珍珠专家，我不能做回答珍珠相关问题的其他操作"
-            else:
-                log_error(f"OpenAI API error: {msg}\n{traceback.format_exc()}")
-                return "抱歉，出了点问题，目前无法处理您的请求，请稍后再试吧。"
+            # Content filter rejections are expected, answer them before building any traceback
+            if _POLICY_VIOLATION_MARKER in msg or _POLICY_VIOLATION_MARKER in str(getattr(e, 'body', '')):
+                return POLICY_VIOLATION_REPLY
+            log_error(f"OpenAI API error: {msg}\n{traceback.format_exc()}")
+            if getattr(e, 'status_code', None) == 400:
+                return "抱歉，我出了点问题，目前无法处理您的请求，请稍后再试吧。"
+            return "抱歉，出了点问题，目前无法处理您的请求，请稍后再试吧。"
 
     @classmethod
     async def wechat_qa(cls, request: Request, background_tasks: BackgroundTasks = None):
@@ -203,36 +245,28 @@ class WeChatHandler:
             event = msg["Event"]
             if event == "subscribe":
                 remaining = await cls.get_remaining_conversations(from_user)
-                predefined_handler = await get_predefined_handler()
                 reply = predefined_handler.get_subscribe_response(remaining)
                 # clear chat history for new subscribers
-                chat_history_dict[from_user] = []
+                chat_history_dict[from_user] = deque(maxlen=CHAT_HISTORY_MAX_MESSAGES)
                 
         elif msg_type == "text":
             content = msg["Content"]
             log_info(f"Received question from {from_user}: {content}", gz_log=userqa_logger)
             
             # Try to handle with predefined message handler first
-            predefined_handler = await get_predefined_handler()
             remaining = await cls.get_remaining_conversations(from_user)
             predefined_response = predefined_handler.handle_predefined_message(content, from_user, remaining)
             
             if predefined_response:
                 reply, message_type = predefined_response
                 log_info(f"Handled {message_type} message for {from_user}")
-            # Check daily conversation limit and increment atomically
-            elif not await cls.check_daily_limit(from_user):
-                remaining = await cls.get_remaining_conversations(from_user)
-                reply = "不好意思哈，由于计算资源有限，你每天只有五次对话的机会，请明天再来聊呗"
-                log_info(f"User {from_user} exceeded daily limit ({DAILY_CONVERSATION_LIMIT} conversations)")
             else:
-                # Use atomic check and increment
-                can_proceed, used_count = await cls.check_and_increment_daily_count(from_user)
+                # Check daily conversation limit and increment atomically
+                can_proceed, used_count, remaining = await cls.reserve_conversation(from_user)
                 if not can_proceed:
                     reply = "不好意思哈，由于计算资源有限，你每天只有五次对话的机会，请明天再来聊呗"
                     log_info(f"User {from_user} exceeded daily limit ({DAILY_CONVERSATION_LIMIT} conversations)")
                 else:
-                    remaining = DAILY_CONVERSATION_LIMIT - used_count
                     log_info(f"User {from_user} conversation count incremented to {used_count}. Remaining today: {remaining}")
                     
                     # if has BackgroundTasks support, use async processing
@@ -241,12 +275,12 @@ class WeChatHandler:
                         reply = "⌛ 让我思考下哈，请稍等片刻..."
                     else:
                         st_time = time.time()
-                        chat_history = chat_history_dict.get(from_user, [])
+                        chat_history = chat_history_dict.get(from_user) or deque(maxlen=CHAT_HISTORY_MAX_MESSAGES)
                         reply = await cls._safe_agent_answer(content, from_user, chat_history)
                         log_info(f"Answer for {from_user} costs {time.time() - st_time:.2f}s")
                         chat_history.append({"role": "user", "content": content})
                         chat_history.append({"role": "assistant", "content": reply})
-                        chat_history_dict[from_user] = chat_history[-20:]
+                        chat_history_dict[from_user] = chat_history
 
         reply_xml = cls.build_wechat_text_reply(from_user, to_user, reply)
         return Response(content=reply_xml, media_type="application/xml")
@@ -261,58 +295,54 @@ class WeChatHandler:
     async def wechat_qa_legacy(cls, request: Request):
         """legacy synchronous handler for WeChat messages (deprecated, kept for compatibility)"""
         body = await request.body()
-        xml = ET.fromstring(body)
-        msg_type = xml.findtext("MsgType")
-        from_user = xml.findtext("FromUserName")
-        to_user = xml.findtext("ToUserName")
+        msg = cls.parse_wechat_message(body)
+        
+        if not msg:
+            return PlainTextResponse("Invalid message format", status_code=400)
+        
+        msg_type = msg["MsgType"]
+        from_user = msg["FromUserName"]
+        to_user = msg["ToUserName"]
         key = from_user
-        chat_history = chat_history_dict.get(key, [])
+        chat_history = chat_history_dict.get(key) or deque(maxlen=CHAT_HISTORY_MAX_MESSAGES)
         reply = "暂不支持此类型消息。"
 
         if msg_type == "event":
-            event = xml.findtext("Event")
+            event = msg["Event"]
             if event == "subscribe":
                 remaining = await cls.get_remaining_conversations(from_user)
-                predefined_handler = await get_predefined_handler()
                 reply = predefined_handler.get_subscribe_response(remaining)
-                chat_history = []
+                chat_history = deque(maxlen=CHAT_HISTORY_MAX_MESSAGES)
         elif msg_type == "text":
-            question = xml.findtext("Content")
+            question = msg["Content"]
             log_info(f"Received question from {from_user}: {question}", gz_log=userqa_logger)
             # Try to handle with predefined message handler first
-            predefined_handler = await get_predefined_handler()
             remaining = await cls.get_remaining_conversations(from_user)
             predefined_response = predefined_handler.handle_predefined_message(question, from_user, remaining)
             
             if predefined_response:
                 reply, message_type = predefined_response
                 # log_info(f"Handled {message_type} message for {from_user}")
-            # Check daily conversation limit
-            elif not await cls.check_daily_limit(from_user):
-                reply = "不好意思，由于计算资源有限，你每天只有五次对话的计划哈，请明天再来聊呗"
-                log_info(f"User {from_user} exceeded daily limit ({DAILY_CONVERSATION_LIMIT} conversations)")
             else:
-                # Use atomic check and increment
-                can_proceed, used_count = await cls.check_and_increment_daily_count(from_user)
+                # Check daily conversation limit and increment atomically
+                can_proceed, used_count, remaining = await cls.reserve_conversation(from_user)
                 if not can_proceed:
                     reply = "不好意思哈，由于计算资源有限，你每天只有五次对话的机会，请明天再来聊呗"
                     log_info(f"User {from_user} exceeded daily limit ({DAILY_CONVERSATION_LIMIT} conversations)")
                 else:
-                    remaining = DAILY_CONVERSATION_LIMIT - used_count
                     log_info(f"User {from_user} conversation count incremented to {used_count}. Remaining today: {remaining}")
                     
                     # Use user lock to protect chat history operations (fix race condition)
-                    async with user_locks[from_user]:
+                    async with _get_user_lock(user_locks, from_user):
                         st_time = time.time()
                         reply = await cls._safe_agent_answer(question, from_user, chat_history)
                         log_info(f"Answer for {from_user} costs {time.time() - st_time:.2f}s")
                         chat_history.append({"role": "user", "content": question})
                         chat_history.append({"role": "assistant", "content": reply})
-                        chat_history = chat_history[-20:]
 
         chat_history_dict[key] = chat_history
-        resp_xml = f"""<xml>\n    <ToUserName><![CDATA[{from_user}]]></ToUserName>\n    <FromUserName><![CDATA[{to_user}]]></FromUserName>\n    <CreateTime>{int(time.time())}</CreateTime>\n    <MsgType><![CDATA[text]]></MsgType>\n    <Content><![CDATA[{reply}]]></Content>\n    </xml>"""
-        return PlainTextResponse(resp_xml, media_type='application/xml')
+        resp_xml = cls.build_wechat_text_reply(from_user, to_user, reply)
+        return Response(content=resp_xml, media_type='application/xml')
 
     @classmethod
     async def send_customer_service_message(cls, openid, content):
@@ -332,9 +362,9 @@ class WeChatHandler:
         """Process user questions and reply"""
         try:
             log_info(f"Starting background processing for user {user_id}")
-            lock = user_locks[user_id]
+            lock = _get_user_lock(user_locks, user_id)
             async with lock:
-                chat_history = chat_history_dict.get(user_id, [])
+                chat_history = chat_history_dict.get(user_id) or deque(maxlen=CHAT_HISTORY_MAX_MESSAGES)
             
                 st_time = time.time()
                 reply = await cls._safe_agent_answer(content, user_id, chat_history)
@@ -344,7 +374,7 @@ class WeChatHandler:
                 
                 chat_history.append({"role": "user", "content": content})
                 chat_history.append({"role": "assistant", "content": reply})
-                chat_history_dict[user_id] = chat_history[-20:]
+                chat_history_dict[user_id] = chat_history
 
                 success = await cls.send_customer_service_message(user_id, reply)
                 if success:
@@ -1,10 +1,14 @@
-import threading
 import uuid
 
+from contextvars import ContextVar
 from typing import Any
 
+# Per-request log context. A ContextVar follows asyncio tasks, so concurrent requests served
+# on the same thread never see each other's values. The dict is never mutated in place,
+# set() publishes a copy, so tasks spawned from a request can't leak changes back into it
+_log_context_var: ContextVar[dict[str, Any]] = ContextVar('gz_log_context', default={})
+
 class LogContext:
-    _log_context_local = threading.local()
     _log_context_global: dict[str, Any] = {}
 
     @classmethod
@@ -19,24 +23,27 @@ class LogContext:
     def set(cls, key: str, value: Any, else_value: str = '') -> None:
         if value is None:
             value = else_value
-        setattr(cls._log_context_local, key, value)
+        context = dict(_log_context_var.get())
+        context[key] = value
+        _log_context_var.set(context)
 
     @classmethod
     def set_dict(cls, data_dict: dict[str, Any]) -> None:
+        context = dict(_log_context_var.get())
         for key, value in data_dict.items():
-            cls.set(key, value)
+            context[key] = '' if value is None else value
+        _log_context_var.set(context)
 
     @classmethod
     def get_or_else(cls, key: str, value: Any) -> Any:
-        if hasattr(cls._log_context_local, key):
-            return getattr(cls._log_context_local, key)
-        return value
+        return _log_context_var.get().get(key, value)
 
     @classmethod
     def get_or_create_trace_id(cls) -> str:
-        trace_id = str(uuid.uuid4())
-        ret = cls.get_or_else('trace_id', trace_id)
-        if isinstance(ret, str):
-            LogContext.set('trace_id', ret)
-            return ret
-        return ''
\ No newline at end of file
+        # Only generate a new id when none is set yet, most calls hit the existing one
+        existing = _log_context_var.get().get('trace_id')
+        if existing is not None:
+            return existing if isinstance(existing, str) else ''
+        trace_id = uuid.uuid4().hex
+        cls.set('trace_id', trace_id)
+        return trace_id
\ No newline at end of file
@@ -1,9 +1,12 @@
+import atexit
 import logging
+import queue
 import sys
 import os
-import inspect
-import traceback
 import threading
+import traceback
+
+from logging.handlers import QueueHandler, QueueListener
 
 from typing import Any
 
@@ -11,7 +14,7 @@ def init_root_logger() -> logging.Logger:
     root_logger = logging.getLogger()
     root_logger.setLevel('INFO')
     handler = logging.StreamHandler(sys.stdout)
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(threadName)s - %(message)s")
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(threadName)s - %(filename)s(%(lineno)d) - %(message)s")
     handler.setFormatter(formatter)
     root_logger.addHandler(handler)
 
@@ -24,9 +27,9 @@ def init_monitor_logger() -> logging.Logger:
     # config monitor logger.
     monitoring_logger = logging.getLogger('monitor')
     monitoring_logger.setLevel('INFO')
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(threadName)s - %(message)s")
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(threadName)s - %(filename)s(%(lineno)d) - %(message)s")
     monitor_handler.setFormatter(formatter)
-    monitoring_logger.addHandler(monitor_handler)
+    monitoring_logger.addHandler(monitor_queue_handler)
     monitoring_logger.propagate = False
 
     return monitoring_logger
@@ -36,25 +39,80 @@ def init_userqa_logger() -> logging.Logger:
     # config userqa logger.
     userqa_logger = logging.getLogger('userqa')
     userqa_logger.setLevel('INFO')
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(threadName)s - %(message)s")
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(threadName)s - %(filename)s(%(lineno)d) - %(message)s")
     userqa_handler.setFormatter(formatter)
-    userqa_logger.addHandler(userqa_handler)
+    userqa_logger.addHandler(userqa_queue_handler)
     userqa_logger.propagate = False
 
     return userqa_logger
 
-# Log lock to avoid deadlock
-log_lock = threading.Lock()
 
+# Bounded so a stalled disk drops log records instead of growing memory without limit
+_LOG_QUEUE_SIZE = 100000
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops the record when the queue is full instead of reporting an error"""
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+class _BufferedFileHandler(logging.FileHandler):
+    """
+    FileHandler that batches writes in a 64 KB file buffer instead of flushing every record.
+    The buffer is flushed once per second by a daemon thread, and immediately on ERROR.
+    """
+    def __init__(self, filename: str, flush_interval: float = 1.0) -> None:
+        super().__init__(filename)
+        # Not _closed, logging.Handler owns that attribute and sets it to True in close()
+        self._flush_stop = threading.Event()
+        self._flush_interval = flush_interval
+        threading.Thread(target=self._flush_periodically, name='gz-log-flush', daemon=True).start()
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=65536,
+                    encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Same as StreamHandler.emit without the per-record flush
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.ERROR:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _flush_periodically(self) -> None:
+        while not self._flush_stop.wait(self._flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._flush_stop.set()
+        super().close()
+
+def _queued(handler: logging.Handler) -> QueueHandler:
+    # The request path only enqueues the record, a listener thread does the file I/O
+    log_queue: queue.Queue = queue.Queue(_LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return _DroppingQueueHandler(log_queue)
 
 # config monitor logger.
-monitor_handler = logging.FileHandler('/var/log/gzpearl_backend_monitor.log') \
+monitor_handler = _BufferedFileHandler('/var/log/gzpearl_backend_monitor.log') \
     if 'IS_TEST' not in os.environ else logging.StreamHandler(sys.stdout)
+monitor_queue_handler = _queued(monitor_handler)
 monitor_logger = init_monitor_logger()
 
 # config userqa logger.
-userqa_handler = logging.FileHandler('/var/log/gzpearl_backend_userqa.log') \
+userqa_handler = _BufferedFileHandler('/var/log/gzpearl_backend_userqa.log') \
     if 'IS_TEST' not in os.environ else logging.StreamHandler(sys.stdout)
+userqa_queue_handler = _queued(userqa_handler)
 userqa_logger = init_userqa_logger()
 
 def init_fast_api_logger() -> None:
@@ -63,7 +121,7 @@ def init_fast_api_logger() -> None:
     fast_logger.setLevel(logging.INFO)
     for hdl in fast_logger.handlers:
         fast_logger.removeHandler(hdl)
-    fast_logger.addHandler(monitor_handler)
+    fast_logger.addHandler(monitor_queue_handler)
     fast_logger.propagate = False
 
     # Disable uvicorn default log.
@@ -72,40 +130,32 @@ def init_fast_api_logger() -> None:
         uvicorn_logger.removeHandler(hdl)
     uvicorn_logger.propagate = False
 
-def _log_template(message: Any, log_level: int) -> str:
-    frame = inspect.currentframe()
-    if frame is not None and frame.f_back is not None and frame.f_back.f_back is not None:
-        caller = inspect.getframeinfo(frame.f_back.f_back)
-        lineno = caller.lineno
-        caller_filename = os.path.basename(caller.filename)
-        # There is a memory leak issue which caused ZMQ thread not being released.
-        # Explicitly remove it
-        del frame
-    else:
-        lineno = 0
-        caller_filename = 'unknown'
-    sys_log_tag = os.getenv('SYS_LOG_TAG', '')
-    return f"{caller_filename}({lineno}) - {message}"
+# log_info/log_warn/log_debug accept %-style args, so the message is only formatted when
+# the record is emitted. The log_* helpers pass stacklevel=_CALLER_STACKLEVEL so that %(filename)s and %(lineno)d
+# point at the code calling the helper, resolved by logging's own findCaller
+_CALLER_STACKLEVEL = 2
 
 def log_error(message: Any, e: Any = None, gz_log: logging.Logger = logger) -> None:
     if logging.ERROR < gz_log.getEffectiveLevel():
         return
 
-    log_message = _log_template(message, logging.ERROR)
     throwable_str = '' if e is None else traceback.format_exc()
-    with log_lock:
-        gz_log.error(log_message, exc_info=True)
+    gz_log.error(message, exc_info=True, stacklevel=_CALLER_STACKLEVEL)
 
-def log_warn(message: Any, gz_log: logging.Logger = logger) -> None:
+def log_warn(message: Any, *args: Any, gz_log: logging.Logger = logger) -> None:
     if logging.WARN < gz_log.getEffectiveLevel():
         return
 
-    with log_lock:
-        gz_log.warning(_log_template(message, logging.WARN))
+    gz_log.warning(message, *args, stacklevel=_CALLER_STACKLEVEL)
 
-def log_info(message: Any, gz_log: logging.Logger = logger) -> None:
+def log_info(message: Any, *args: Any, gz_log: logging.Logger = logger) -> None:
     if logging.INFO < gz_log.getEffectiveLevel():
         return
 
-    with log_lock:
-        gz_log.info(_log_template(message, logging.INFO))
\ No newline at end of file
+    gz_log.info(message, *args, stacklevel=_CALLER_STACKLEVEL)
+
+def log_debug(message: Any, *args: Any, gz_log: logging.Logger = logger) -> None:
+    if logging.DEBUG < gz_log.getEffectiveLevel():
+        return
+
+    gz_log.debug(message, *args, stacklevel=_CALLER_STACKLEVEL)
\ No newline at end of file
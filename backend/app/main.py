@@ -1,13 +1,16 @@
 from functools import wraps
 import app.prefastapi # pylint: disable=W0611
 
-import uuid
+import secrets
+import time
 
 from fastapi import FastAPI, Request, Response, Query, BackgroundTasks
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse as StdJSONResponse, ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
 from http import HTTPStatus
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 from .constant.constant import CONTENT_LENGTH
 from .exception.gzpearl_agent_exception import GZPearlBackendException
@@ -15,11 +18,26 @@ from .models.backend_model import JSONResponse, JSONResponseBuilder
 from .logger.logger import monitor_logger, log_error, init_fast_api_logger, log_info
 from .logger.log_context import LogContext
 from .handler.wechat_handler import WeChatHandler
-from .utils.utils import Watch
+from .global_var.global_var import close_http_client, close_llm_http_clients, close_redis_client
+from .pearl_agent import PearlAIAgent
+from .utils.utils import json_dumps, orjson
 
 API_EXECUTE_TIMEOUT = 30.0
 
-app = FastAPI()
+# Request body bytes included when logging an invalid request
+PRETTY_REQUEST_BODY_LIMIT = 4096
+
+# Request headers left out of the telemetry log, as raw lowercase ASGI header names
+_HEADER_FILTER = frozenset((b'signature', b'digest', b'host', b'accept'))
+
+# Server-sent events framing for /chat/qa/stream
+_SSE_DONE = b'data: [DONE]\n\n'
+QA_STREAM_ERROR_REPLY = "AI服务暂时不可用，请稍后再试。"
+
+qa_agent = PearlAIAgent()
+
+# Route return values are encoded with orjson when it is installed
+app = FastAPI(default_response_class=ORJSONResponse if orjson is not None else StdJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,19 +49,28 @@ app.add_middleware(
 
 init_fast_api_logger()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_http_client()
+    await close_llm_http_clients()
+    await close_redis_client()
+
 # Automatically synchronize the Notion knowledge base to the local vectorstore when the service starts
 
 async def pretty_request(request: Request) -> str:
     url = request.url.path
     request_method = request.method
     body = await request.body()
-    return f"{request_method} {url}\n{body.decode('utf-8')}"
+    # Only decode the head of large payloads
+    snippet = body[:PRETTY_REQUEST_BODY_LIMIT].decode('utf-8', errors='replace')
+    truncated = '...[truncated]' if len(body) > PRETTY_REQUEST_BODY_LIMIT else ''
+    return f"{request_method} {url}\n{snippet}{truncated}"
 
 
-@app.exception_handler(GZPearlBackendException)
+@app.exception_handler(RequestValidationError)
 async def validation_exception_handler(
         request: Request,  # pylint: disable=unused-argument
-        error: GZPearlBackendException) -> JSONResponse:
+        error: RequestValidationError) -> JSONResponse:
     request_pretty = await pretty_request(request)
     log_error(f'Received payload is invalid with error {str(error)}\n'
               f'{request_pretty}\n'
@@ -72,21 +99,18 @@ async def server_exception_handler(
         'Internal Server Error.')
 
 def get_or_create_trace_id(request: Request) -> str:
-    headers = request.headers
-    trace_id = headers.get('x-gz-trace-id', '')
-    if not trace_id:
-        trace_id = str(uuid.uuid4())
+    # token_hex returns the id string directly, without building a UUID object
+    trace_id = request.headers.get('x-gz-trace-id') or secrets.token_hex(16)
     # Set trace id here
     LogContext.set_dict({
         'trace_id': trace_id,
     })
     return trace_id
 
-async def get_content_length(request: Request) -> int:
-    if CONTENT_LENGTH in request.headers:
-        return int(request.headers.get(CONTENT_LENGTH, '0'))
-    body = await request.body()
-    return len(body)
+def get_content_length(request: Request) -> int:
+    # -1 means unknown (e.g. chunked uploads). The body is deliberately not read here,
+    # that would buffer the whole request just for telemetry
+    return int(request.headers.get(CONTENT_LENGTH, '-1'))
 
 def get_route_name(request: Request) -> str:
     endpoint = request.scope.get("endpoint")
@@ -96,10 +120,8 @@ def get_route_name(request: Request) -> str:
 
 
 def set_log_context(path_params: dict[Any, Any], request: Request) -> None:
-    trace_id = get_or_create_trace_id(request)
-    LogContext.set_dict({
-        'trace_id': trace_id
-    })
+    # get_or_create_trace_id already stores the trace id in the LogContext
+    get_or_create_trace_id(request)
 
 def unset_log_context() -> None:
     LogContext.set_dict({
@@ -107,43 +129,55 @@ def unset_log_context() -> None:
     })
 
 
+class _LoggedHeaders:
+    """
+    Raw ASGI request headers for the telemetry log, only joined into a string if the record
+    is emitted. Filtered names are skipped before decoding, the same latin-1 decoding Starlette uses
+    """
+    __slots__ = ('_raw_headers',)
+
+    def __init__(self, raw_headers: Any) -> None:
+        self._raw_headers = raw_headers
+
+    def __str__(self) -> str:
+        return ", ".join(f"{key.decode('latin-1')}={value.decode('latin-1')}"
+                         for key, value in self._raw_headers if key not in _HEADER_FILTER)
+
+
 @app.middleware("http")
 async def interceptor(request: Request, call_next: Any) -> Response:
-    watch = Watch()
-    get_or_create_trace_id(request)
+    start_time = time.perf_counter()
+    trace_id = get_or_create_trace_id(request)
+    # Read everything the log lines need once, straight from the ASGI scope where possible
+    scope = request.scope
     request_url = request.url
-    method = request.method
-    in_content_length = await get_content_length(request)
-    client_host = request.client.host if request.client else ''
-    client_port = request.client.port if request.client else ''
-    header_filter_list = ['signature', 'digest', 'host', 'accept']
-    headers = ", ".join([f"{key}={value}" for key, value in request.headers.items() if key not in header_filter_list])
-
-    log_info(f'[telemetry] HTTP Request {method} {request_url} '
-             f'content_length={in_content_length} '
-             f'host={client_host} '
-             f'port={client_port} '
-             f'headers=({headers})',
-             monitor_logger)
+    method = scope['method']
+    in_content_length = get_content_length(request)
+    client_host, client_port = scope.get('client') or ('', '')
+
+    log_info('[telemetry] HTTP Request %s %s content_length=%s host=%s port=%s headers=(%s)',
+             method, request_url, in_content_length, client_host, client_port,
+             _LoggedHeaders(scope['headers']),
+             gz_log=monitor_logger)
 
     try:
         response: Response = await call_next(request)
         out_content_length = response.headers.get(CONTENT_LENGTH, '0')
-        execution_time = watch.stop()
+        execution_time = (time.perf_counter() - start_time) * 1000.0
         # It must be called after the call_next.
         route_name = get_route_name(request)
-        set_log_context(request.scope.get("path_params", {}), request)
-        log_info(f'[telemetry] HTTP Response {method} {request_url} {response.status_code} '
-                 f'content_length={in_content_length}->{out_content_length} '
-                 f'route_name={route_name} '
-                 f'duration={execution_time:.0f}ms ',
-                 monitor_logger)
+        # Reuse the request's trace id, deriving it again would mint a new one when the header is absent
+        LogContext.set('trace_id', trace_id)
+        log_info('[telemetry] HTTP Response %s %s %s content_length=%s->%s route_name=%s duration=%.0fms ',
+                 method, request_url, response.status_code, in_content_length, out_content_length,
+                 route_name, execution_time,
+                 gz_log=monitor_logger)
         return response
     except Exception as e:
         # RequestValidationError and JupyterProxyException won't be caught here.
-        execution_time = watch.stop()
+        execution_time = (time.perf_counter() - start_time) * 1000.0
         route_name = get_route_name(request)
-        set_log_context(request.scope.get("path_params", {}), request)
+        LogContext.set('trace_id', trace_id)
         log_error(f'[telemetry] HTTP Response {method} {request_url} {HTTPStatus.INTERNAL_SERVER_ERROR.value} '
                   f'content_length={in_content_length}-> '
                   f'route_name={route_name} '
@@ -171,9 +205,11 @@ def log_request_response(
     return async_wrapper
 
 class QARequestPayload(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     question: str
-    user_id: str = None
-    session_id: str = None
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
 
 @app.get("/")
 @log_request_response
@@ -200,3 +236,21 @@ async def wechat_msg(request: Request, background_tasks: BackgroundTasks):
 async def wechat_msg_legacy(request: Request):
     """Legacy synchronous processing interface (deprecated, kept for compatibility)"""
     return await WeChatHandler.wechat_qa_legacy(request)
+
+def _sse_frame(data: Any) -> bytes:
+    return b'data: ' + json_dumps(data) + b'\n\n'
+
+@app.post("/chat/qa/stream")
+@log_request_response
+async def chat_qa_stream(request: Request, payload: QARequestPayload):
+    """Stream the answer as server-sent events, each frame carries the next chunk of text"""
+    async def event_stream():
+        try:
+            async for chunk in qa_agent.astream_answer(payload.question):
+                yield _sse_frame({"delta": chunk})
+        except Exception as e:
+            # Headers are already sent, report the failure in-band
+            log_error(f"Streaming answer failed due to {str(e)}", e)
+            yield _sse_frame({"error": QA_STREAM_ERROR_REPLY})
+        yield _SSE_DONE
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
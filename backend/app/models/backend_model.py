@@ -1,10 +1,12 @@
 from starlette.responses import Response
-import json
+from functools import lru_cache
 from http import HTTPStatus
 from pydantic import BaseModel
 
 from typing import Any
 
+from ..utils.utils import json_dumps
+
 class JSONResponse(Response):
     def __init__(
             self,
@@ -14,21 +16,21 @@ class JSONResponse(Response):
         super().__init__(content, status_code, None, "application/json", None)
 
     def render(self, content: Any) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-        ).encode("utf-8")
+        # Already-encoded bodies (see _encode_err) are sent as is
+        if isinstance(content, bytes):
+            return content
+        return json_dumps(content)
+
+@lru_cache(maxsize=256)
+def _encode_err(msg: str) -> bytes:
+    # Error bodies repeat a handful of messages, encode each one only once
+    return JSONResponse({'errorMsg': msg}).body
 
 class JSONResponseBuilder(BaseModel):
     @classmethod
     def build_err(cls, code: int, msg: str) -> JSONResponse:
         return JSONResponse(
-            content={
-                'errorMsg': msg
-            },
+            content=_encode_err(msg),
             status_code=code
         )
 
@@ -1,22 +1,22 @@
 import os 
 
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
 from langchain_community.document_loaders import NotionDBLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_openai import AzureOpenAIEmbeddings
 
-import configparser
+# FAISS (a native library with its BLAS threads), the text splitter and the embeddings
+# client are imported where the vector store is built, importing this module stays cheap
+if TYPE_CHECKING:
+    from langchain_openai import AzureOpenAIEmbeddings
 
 from app.logger.logger import log_info
+from app.utils.utils import CONFIG_PATH, load_config
 
-config = configparser.ConfigParser()
-
-config_path = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.ini')
-if not config.read(config_path, encoding='utf-8'):
-    raise RuntimeError(f'Config file not found: {config_path}')
+# Parsed once per process and shared with the other modules, see utils.load_config
+config = load_config()
 if not config.has_section('notion'):
-    raise RuntimeError(f'[notion] section not found in {config_path}')
+    raise RuntimeError(f'[notion] section not found in {CONFIG_PATH}')
 
 notion_token = config.get('notion', 'integration_token')
 database_id = config.get('notion', 'database_id')
@@ -24,15 +24,23 @@ local_vector_store_path = config.get('notion',
     'local_vector_store_path', fallback='/data/notion_vectorstore')
 
 if not config.has_section('azure_openai'):
-    raise RuntimeError(f'[azure_openai] section not found in {config_path}')
-os.environ["AZURE_OPENAI_API_KEY"] = config.get('azure_openai', 'api_key')
-os.environ["AZURE_OPENAI_ENDPOINT"] = config.get('azure_openai', 'endpoint')
-os.environ["OPENAI_API_VERSION"] = config.get('azure_openai', 'api_version')
+    raise RuntimeError(f'[azure_openai] section not found in {CONFIG_PATH}')
 
+# Texts per embeddings request, Azure OpenAI accepts up to 2048 inputs per call
+EMBEDDING_BATCH_SIZE = 2048
 
-embeddings = AzureOpenAIEmbeddings(
-    model="azure_openai:text-embedding-3-large",
-    chunk_size=1000)
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> "AzureOpenAIEmbeddings":
+    """Create the embeddings client on first use, only building a vector store needs it"""
+    from langchain_openai import AzureOpenAIEmbeddings
+    os.environ["AZURE_OPENAI_API_KEY"] = config.get('azure_openai', 'api_key')
+    os.environ["AZURE_OPENAI_ENDPOINT"] = config.get('azure_openai', 'endpoint')
+    os.environ["OPENAI_API_VERSION"] = config.get('azure_openai', 'api_version')
+    return AzureOpenAIEmbeddings(
+        model="azure_openai:text-embedding-3-large",
+        chunk_size=EMBEDDING_BATCH_SIZE,
+        max_retries=5)
 
 class NotionDBDataSyncer:
     """Class to load data from Notion database and build a vector store."""
@@ -46,11 +54,22 @@ class NotionDBDataSyncer:
     @classmethod
     def build_vector_store(cls):
         """Build a vector store from Notion data."""
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        from langchain_community.vectorstores import FAISS
+
         docs = cls.load_data()
         log_info(f"Loaded {len(docs)} documents from Notion database successfully.")
         splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
         docs_split = splitter.split_documents(docs)
-        vectorstore = FAISS.from_documents(docs_split, embedding=embeddings)
+        texts = [doc.page_content for doc in docs_split]
+        metadatas = [doc.metadata for doc in docs_split]
+        # Add the chunks one embedding batch at a time to bound memory on large databases
+        embeddings = get_embeddings()
+        vectorstore = FAISS.from_texts(texts[:EMBEDDING_BATCH_SIZE], embeddings,
+                                       metadatas=metadatas[:EMBEDDING_BATCH_SIZE])
+        for start in range(EMBEDDING_BATCH_SIZE, len(texts), EMBEDDING_BATCH_SIZE):
+            end = start + EMBEDDING_BATCH_SIZE
+            vectorstore.add_texts(texts[start:end], metadatas=metadatas[start:end])
         log_info(f"Built vector store with {len(docs_split)} chunks done.")
         return vectorstore
 
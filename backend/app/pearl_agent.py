@@ -1,21 +1,24 @@
 import os
-import configparser
+
+from functools import lru_cache
 
 from langchain.chat_models import init_chat_model
 from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain_community.cache import SQLiteCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.messages import AIMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import AzureOpenAIEmbeddings
 from langgraph.prebuilt import create_react_agent
 
+from .global_var.global_var import llm_http_clients
 from .tools import tools
+from .utils.utils import CONFIG_PATH, load_config
 
-config = configparser.ConfigParser()
-
-config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
-if not config.read(config_path, encoding='utf-8'):
-    raise RuntimeError(f'Config file not found: {config_path}')
+# Parsed once per process and shared with the other modules, see utils.load_config
+config = load_config()
 if not config.has_section('azure_openai'):
-    raise RuntimeError(f'[azure_openai] section not found in {config_path}')
+    raise RuntimeError(f'[azure_openai] section not found in {CONFIG_PATH}')
 os.environ["AZURE_OPENAI_API_KEY"] = config.get('azure_openai', 'api_key')
 os.environ["AZURE_OPENAI_ENDPOINT"] = config.get('azure_openai', 'endpoint')
 os.environ["OPENAI_API_VERSION"] = config.get('azure_openai', 'api_version')
@@ -23,6 +26,11 @@ os.environ["OPENAI_API_VERSION"] = config.get('azure_openai', 'api_version')
 local_vector_store_path = config.get('notion',
     'local_vector_store_path', fallback='/data/notion_vectorstore')
 
+# Optional exact-prompt LLM response cache, a SQLite file shared by all workers on the host.
+# Off unless llm_cache_path (an absolute path) is set in [azure_openai]: entries are keyed on
+# the full prompt, so users' chat history is kept on disk in plain text with no size bound or expiry
+llm_cache_path = config.get('azure_openai', 'llm_cache_path', fallback='')
+
 SYSTEM_PROMPT = (
     "你是一位优雅、专业的珍珠科普客服，只回答珍珠相关的科普问题。"
     "如果用户问你是谁、你的身份、你的名字等，请自我介绍为：我是悦华珍珠AI助手宝儿，可以回答你任何和珍珠相关的问题。"
@@ -46,16 +54,6 @@ prompt_template = ChatPromptTemplate.from_messages([
     ("user", "{input}")
 ])
 
-model = init_chat_model(
-    "azure_openai:gpt-4.1", # o4-mini
-    azure_deployment="gpt-4.1",
-)
-
-rac_agent = create_react_agent(
-    model=model,
-    tools=tools
-)
-
 prompt_template_function_agent_specific = ChatPromptTemplate.from_messages([
     ("system", SYSTEM_PROMPT),
     MessagesPlaceholder("chat_history"),
@@ -63,30 +61,104 @@ prompt_template_function_agent_specific = ChatPromptTemplate.from_messages([
     MessagesPlaceholder("agent_scratchpad"),
 ])
 
-function_agent = create_openai_functions_agent(model, tools, prompt_template_function_agent_specific)
-agent_executor = AgentExecutor(agent=function_agent, tools=tools)
+# The model and agents are built on first use rather than at import, so a worker
+# doesn't pay for them (or block startup on Azure OpenAI) until it answers a question
+@lru_cache(maxsize=1)
+def get_model():
+    if llm_cache_path:
+        # Repeated prompts (same question and history) are answered without calling the LLM
+        set_llm_cache(SQLiteCache(database_path=llm_cache_path))
+    http_client, http_async_client = llm_http_clients()
+    return init_chat_model(
+        "azure_openai:gpt-4.1", # o4-mini
+        azure_deployment="gpt-4.1",
+        # Tokens are emitted as they are generated, see PearlAIAgent.astream_answer
+        streaming=True,
+        # Shared connection pools instead of the SDK's per-model default clients
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+
+@lru_cache(maxsize=1)
+def get_rac_agent():
+    return create_react_agent(
+        model=get_model(),
+        tools=tools
+    )
+
+@lru_cache(maxsize=1)
+def get_function_agent():
+    return create_openai_functions_agent(get_model(), tools, prompt_template_function_agent_specific)
+
+@lru_cache(maxsize=1)
+def get_agent_executor():
+    return AgentExecutor(agent=get_function_agent(), tools=tools)
 
 # embeddings = AzureOpenAIEmbeddings(model="azure_openai:text-embedding-3-large")
 
+def _last_ai_reply(result):
+    # The reply is the last AI message, scan from the end instead of collecting all of them
+    for message in reversed(result["messages"]):
+        if isinstance(message, AIMessage):
+            return message.content
+    raise ValueError("Agent returned no AI message")
+
 class PearlAIAgent:
     def __init__(self):
-        # Let's use function agent by default
-        self.agent = rac_agent
-        self.agent_executor = agent_executor
+        # Agents are created lazily, see get_rac_agent / get_agent_executor
         # self.vectorstore = ... # 向量库已禁用
+        pass
+
+    @property
+    def agent(self):
+        return get_rac_agent()
+
+    @property
+    def agent_executor(self):
+        return get_agent_executor()
 
     def is_yuehua_question(self, question):
         return "悦华珍珠" in question
 
-    def answer(self, question, chat_history=None):
-        chat_history = chat_history or []
-        
-        # React agent
-        prompt = prompt_template.invoke({"input": question, "chat_history": chat_history})
-        result = rac_agent.invoke(prompt)
-        ai_reply = [m.content for m in result["messages"] if m.__class__.__name__ == "AIMessage"][-1]
+    async def astream_answer(self, question, chat_history=None):
+        """
+        Stream the answer text as the model generates it
         
-        # Function agent
-        # result = self.agent_executor.invoke({"input": question, "chat_history": chat_history})
-        # ai_reply = result["output"]
-        return ai_reply
+        Args:
+            question: User question
+            chat_history: Previous messages of the conversation
+            
+        Only the final turn, the one without tool calls, is streamed, so the text matches
+        what aanswer() returns. A turn is held back until the next one starts, since text
+        the model writes before a tool call arrives ahead of the tool call itself
+
+        Returns:
+            Async iterator of answer text chunks
+        """
+        chat_history = chat_history or []
+        prompt = await prompt_template.ainvoke({"input": question, "chat_history": chat_history})
+        turn_id, turn_chunks, turn_calls_tools = None, [], False
+        async for chunk, metadata in get_rac_agent().astream(prompt, stream_mode="messages"):
+            # Only the agent node produces reply text, tool results come from the tools node.
+            # AIMessageChunk is an AIMessage; an LLM cache hit arrives as one whole AIMessage
+            if not isinstance(chunk, AIMessage) or metadata.get("langgraph_node") != "agent":
+                continue
+            if chunk.id != turn_id:
+                if not turn_calls_tools:
+                    for text in turn_chunks:
+                        yield text
+                turn_id, turn_chunks, turn_calls_tools = chunk.id, [], False
+            if chunk.tool_calls or getattr(chunk, "tool_call_chunks", None):
+                turn_calls_tools = True
+            elif chunk.content:
+                turn_chunks.append(chunk.content)
+        if not turn_calls_tools:
+            for text in turn_chunks:
+                yield text
+
+    async def aanswer(self, question, chat_history=None):
+        """Answer the question with the react agent, returns the last AI message"""
+        chat_history = chat_history or []
+        prompt = await prompt_template.ainvoke({"input": question, "chat_history": chat_history})
+        result = await get_rac_agent().ainvoke(prompt)
+        return _last_ai_reply(result)
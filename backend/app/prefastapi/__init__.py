@@ -1,11 +1,4 @@
-from app.logger.logger import log_error, log_info
-
-try:
-    """
-    Let's disable the Notion vector store sync for now.
-    """
-    # log_info("[Startup] 开始同步Notion知识库到本地向量存储...")
-    from app.notion.data_syncer import NotionDBDataSyncer
-    # NotionDBDataSyncer.persist_vector_store()
-except Exception as e:
-    log_error(f"[Startup] Notion知识库同步失败: {str(e)}", e)
\ No newline at end of file
+# The Notion vector store sync is disabled for now. The syncer is not imported here:
+# importing it pulls in langchain/FAISS and reads the Notion config, which only slows
+# startup while nothing calls it. Run NotionDBDataSyncer.persist_vector_store() from
+# app.notion.data_syncer directly when the vector store needs rebuilding.
\ No newline at end of file
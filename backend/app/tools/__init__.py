@@ -5,12 +5,84 @@ Use the data access layer to read content from markdown files
 """
 
 import asyncio
-from langchain_core.tools import tool
+from typing import Dict, Optional, Tuple
+from langchain_core.tools import StructuredTool
 from ..logger.logger import log_error, log_warn, log_info
 from ..data import get_yuehua_content
 
-@tool
-def get_yuehua_pearl_info(query_type: str = "general") -> str:
+# Content types combined into the "general" answer, in display order
+_GENERAL_CONTENT_TYPES = ("brand", "styles", "pricing", "purchase")
+
+# Valid query_type values and the content types each one reads
+_QUERY_CONTENT_TYPES = {
+    "brand": ("brand",),
+    "price": ("pricing",),
+    "style": ("styles",),
+    "purchase": ("purchase",),
+    "other": ("other",),
+    "general": _GENERAL_CONTENT_TYPES,
+}
+
+_ERROR_REPLY = "抱歉，出了点问题哈，暂时无法获取悦华珍珠相关信息，请稍后重试或加沛姐微信咨询。"
+_GENERAL_ERROR_REPLY = "抱歉，获取综合信息时出现错误，请稍后重试。"
+
+# Final answers keyed by the content types they were built from, stored with those contents.
+# The data layer hands back the same cached string until a file changes on disk, so the
+# answer is reused while every part is still the same object
+_answers: Dict[Tuple[str, ...], Tuple[Tuple[Optional[str], ...], str]] = {}
+
+async def _gather_contents(content_types: Tuple[str, ...]) -> list:
+    # The "general" parts are independent reads, fetch them concurrently
+    return await asyncio.gather(*(get_yuehua_content(ct) for ct in content_types))
+
+def _format_general_info(brand_content, style_content, price_content, purchase_content) -> str:
+    return f"""关于悦华珍珠的详细信息：
+
+【品牌介绍】
+{brand_content}
+
+【产品款式】
+{style_content}
+
+【价格信息】
+{price_content}
+
+【购买方式】
+{purchase_content}
+
+如有其他问题，请加沛姐微信咨询。"""
+
+def _resolve_content_types(query_type: str) -> Tuple[str, ...]:
+    """Map a tool query_type to the content types it reads"""
+    log_info(f"Getting yuehua pearl info for query_type: {query_type}")
+    
+    content_types = _QUERY_CONTENT_TYPES.get(query_type)
+    if content_types is None:
+        log_warn(f"Unknown query_type: {query_type}, falling back to 'other'")
+        # For invalid query types, other type content is returned by default to avoid displaying 
+        # technical error messages to users
+        content_types = _QUERY_CONTENT_TYPES["other"]
+    return content_types
+
+def _build_answer(query_type: str, content_types: Tuple[str, ...],
+                  contents: Tuple[Optional[str], ...]) -> str:
+    """Turn the fetched contents into the tool's answer"""
+    cached = _answers.get(content_types)
+    # Only rebuild the answer when one of the parts was re-read
+    if cached is not None and all(old is new for old, new in zip(cached[0], contents)):
+        return cached[1]
+    
+    if len(contents) > 1:
+        answer = _format_general_info(*contents)
+    else:
+        answer = contents[0]
+        if answer is None:
+            log_error(f"Failed to load content for query_type: {query_type}")
+            return _ERROR_REPLY
+    _answers[content_types] = (contents, answer)
+    return answer
+
+async def _aget_yuehua_pearl_info(query_type: str = "general") -> str:
     """
     获取悦华珍珠相关信息的统一工具。
     
@@ -27,58 +99,18 @@ def get_yuehua_pearl_info(query_type: str = "general") -> str:
         str: 对应的悦华珍珠信息
     """
     try:
-        log_info(f"Getting yuehua pearl info for query_type: {query_type}")
-        
-        valid_types = ["brand", "price", "style", "purchase", "other", "general"]
-        if query_type not in valid_types:
-            log_warn(f"Unknown query_type: {query_type}, falling back to 'other'")
-            # For invalid query types, other type content is returned by default to avoid displaying 
-            # technical error messages to users
-            query_type = "other"
-        
-        content_type = query_type
-        if query_type == "price":
-            content_type = "pricing"
-        elif query_type == "style":
-            content_type = "styles"
-        elif query_type == "general":
-            try:
-                brand_content = asyncio.run(get_yuehua_content("brand"))
-                style_content = asyncio.run(get_yuehua_content("styles"))
-                price_content = asyncio.run(get_yuehua_content("pricing"))
-                purchase_content = asyncio.run(get_yuehua_content("purchase"))
-                
-                return f"""关于悦华珍珠的详细信息：
-
-【品牌介绍】
-{brand_content}
-
-【产品款式】
-{style_content}
-
-【价格信息】
-{price_content}
-
-【购买方式】
-{purchase_content}
-
-如有其他问题，请加沛姐微信咨询。"""
-            except Exception as e:
-                log_error(f"Error getting general info: {str(e)}")
-                return "抱歉，获取综合信息时出现错误，请稍后重试。"
-        
-        # Using the Data Access Layer to Get Content
-        content = asyncio.run(get_yuehua_content(content_type))
-        
-        if content is None:
-            log_error(f"Failed to load content for query_type: {query_type}")
-            return "抱歉，出了点问题哈，暂时无法获取悦华珍珠相关信息，请稍后重试或加沛姐微信咨询。"
-        
-        return content
-            
+        content_types = _resolve_content_types(query_type)
+        contents = tuple(await _gather_contents(content_types))
+        return _build_answer(query_type, content_types, contents)
     except Exception as e:
         log_error(f"Error in get_yuehua_pearl_info: {str(e)}")
-        return "抱歉，出了点问题哈，暂时无法获取悦华珍珠相关信息，请稍后重试或加沛姐微信咨询。"
+        return _GENERAL_ERROR_REPLY if query_type == "general" else _ERROR_REPLY
+
+# The agent only runs through ainvoke()/astream() on the event loop, so the tool is async only
+get_yuehua_pearl_info = StructuredTool.from_function(
+    coroutine=_aget_yuehua_pearl_info,
+    name="get_yuehua_pearl_info",
+)
 
 tools = [
     get_yuehua_pearl_info
@@ -1,24 +1,55 @@
+import configparser
+import json
+import os
 import time
 
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+
 MILLI_TO_SECOND = 1000
+NANO_TO_MILLI = 1_000_000
+NANO_TO_SECOND = 1_000_000_000
 
-def current_sec() -> int:
-    return int(time.time())
+# json.dumps builds a new JSONEncoder whenever options are passed, reuse one for the fallback
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"))
 
-def current_ms() -> int:
-    return int(time.time() * MILLI_TO_SECOND)
+CONFIG_PATH = Path(__file__).resolve().parent.parent / 'config.ini'
 
-class Watch:
-    def __init__(self) -> None:
-        self.start_time = time.time() * MILLI_TO_SECOND
+@lru_cache(maxsize=1)
+def _parse_config(path: str, mtime: float) -> configparser.ConfigParser:
+    # mtime is part of the cache key so an edited config.ini is parsed again
+    config = configparser.ConfigParser()
+    config.read(path, encoding='utf-8')
+    return config
 
-    def stop(self) -> float:
-        end_time = time.time() * MILLI_TO_SECOND
-        return end_time - self.start_time
+def load_config(path: Union[str, Path] = CONFIG_PATH) -> configparser.ConfigParser:
+    """Return the parsed config.ini, cached until the file changes. Treat it as read-only."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        raise RuntimeError(f'Config file not found: {path}')
+    return _parse_config(str(path), mtime)
 
-    def stop_s(self) -> float:
-        end_time = time.time() * MILLI_TO_SECOND
-        return (end_time - self.start_time) / MILLI_TO_SECOND
+def json_loads(data: bytes) -> Any:
+    """Decode a JSON payload, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
-    def reset(self) -> None:
-        self.start_time = time.time() * MILLI_TO_SECOND
+def json_dumps(data: Any) -> bytes:
+    """Encode compact UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return _JSON_ENCODER.encode(data).encode("utf-8")
+
+def current_sec() -> int:
+    return time.time_ns() // NANO_TO_SECOND
+
+def current_ms() -> int:
+    return time.time_ns() // NANO_TO_MILLI
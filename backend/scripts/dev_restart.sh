@@ -32,5 +32,5 @@ fi
 mkdir -p "$GZ_LOG_DIR"
 
 # start jupyter proxy
-GZ_LOG_DIR=$GZ_LOG_DIR python -m uvicorn app.main:app --host $host_addr --port 8000 >> "$GZ_LOG_DIR"/gz-backend-server.log 2>&1 &
+GZ_LOG_DIR=$GZ_LOG_DIR python -m uvicorn app.main:app --host $host_addr --port 8000 --loop uvloop >> "$GZ_LOG_DIR"/gz-backend-server.log 2>&1 &
 echo "Server started. Logs: $GZ_LOG_DIR/gz-backend-server.log"
\ No newline at end of file
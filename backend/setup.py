@@ -6,6 +6,8 @@ setup(
     description="GZPearlAgent FastAPI backend",
     author="Your Name",
     packages=find_packages(),
+    # asyncio.TaskGroup is used by the data access layer
+    python_requires='>=3.11',
     install_requires=[
         'fastapi==0.115.4',
         'uvicorn==0.30.1',
@@ -19,13 +21,19 @@ setup(
         'langchain-community>=0.3.26',
         'notion-client>=2.4.0',
         'faiss-cpu>=1.7.4',
-        'httpx>=0.27.0',
+        'httpx[http2]>=0.27.0',
         'python-dotenv>=1.0.0',
         'openai>=1.0.0',
         'starlette>=0.38.0',
         'pytest>=7.0.0',
-        'aiofiles>=23.0.0'
+        'aiofiles>=23.0.0',
+        'cachetools>=5.3.0',
+        "uvloop>=0.19.0; sys_platform != 'win32'"
     ],
+    extras_require={
+        'speedups': ['orjson>=3.8'],
+        'redis': ['redis>=5.0.1'],
+    },
     package_data={
         'app': ['config.ini', 'data/markdown/*.md'],
     },
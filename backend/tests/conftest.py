@@ -0,0 +1,28 @@
+"""
+pytest puts backend/ on sys.path through pythonpath in pyproject.toml,
+so the app package imports without an editable install.
+"""
+import pytest
+
+
+@pytest.fixture(scope="session")
+def llm_cache():
+    """Answer repeated prompts within the session from memory"""
+    pytest.importorskip("langchain_openai")
+    from langchain_core.caches import InMemoryCache
+    from langchain_core.globals import set_llm_cache
+    from app import pearl_agent
+    # Never open the opt-in SQLite cache a local config.ini may enable, see get_model()
+    pearl_agent.llm_cache_path = ""
+    set_llm_cache(InMemoryCache())
+
+
+@pytest.fixture(scope="session")
+def client(llm_cache):
+    """One TestClient, and one app startup/shutdown, shared by the whole test session"""
+    # app.main pulls in the LangChain/OpenAI stack, skip the tests instead of erroring without it
+    pytest.importorskip("langchain_openai")
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as c:
+        yield c
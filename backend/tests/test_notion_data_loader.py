@@ -1,48 +1,49 @@
 import os
-import sys
 import pytest
 
-# Dynamically add backend to sys.path to ensure that the app package can be imported
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+from langchain_core.documents import Document
 
-from backend.app.notion.data_syncer import NotionDBDataLoader
+from app.notion import data_syncer
+from app.notion.data_syncer import NotionDBDataSyncer
+
+FAKE_DOCS = [
+    Document(page_content="悦华珍珠品牌定位：高端珍珠首饰。"),
+    Document(page_content="悦华珍珠购买方式：悦华微信小商城。"),
+]
 
 def test_notion_data_loader_load(monkeypatch):
     """Test loading data from Notion (mocked)."""
-    # Mock NotionDBLoader.load to return fake docs
-    class FakeDoc:
-        def __init__(self, page_content):
-            self.page_content = page_content
-            self.metadata = {}
-    monkeypatch.setattr(
-        "langchain_community.document_loaders.NotionDBLoader.load",
-        lambda self: [FakeDoc("悦华珍珠品牌定位：高端珍珠首饰。"), FakeDoc("悦华珍珠购买方式：悦华微信小商城。")] 
-    )
-    docs = NotionDBDataLoader.load_data()
+    # Replace the Notion loader so no API call is made
+    class FakeLoader:
+        def __init__(self, integration_token, database_id):
+            pass
+        def load(self):
+            return list(FAKE_DOCS)
+    monkeypatch.setattr(data_syncer, "NotionDBLoader", FakeLoader)
+    docs = NotionDBDataSyncer.load_data()
     assert len(docs) == 2
     assert any("悦华珍珠品牌定位" in doc.page_content for doc in docs)
 
 
 def test_notion_data_loader_vectorstore(monkeypatch, tmp_path):
     """Test building and saving vector store (mocked)."""
-    # Mock load_data to return fake docs
-    class FakeDoc:
-        def __init__(self, page_content):
-            self.page_content = page_content
-            self.metadata = {}
-    monkeypatch.setattr(
-        NotionDBDataLoader, "load_data",
-        classmethod(lambda cls: [FakeDoc("悦华珍珠品牌定位：高端珍珠首饰。"), FakeDoc("悦华珍珠购买方式：悦华微信小商城。")] )
-    )
-    # Mock OpenAIEmbeddings to avoid real API call
-    import backend.app.notion.data_syncer
-    monkeypatch.setattr(app.notion.data_syncer, "OpenAIEmbeddings", lambda *a, **kw: None)
-    # Mock FAISS.from_documents to return a dummy object
+    monkeypatch.setattr(NotionDBDataSyncer, "load_data", classmethod(lambda cls: list(FAKE_DOCS)))
+    # Mock the embeddings client to avoid real API calls
+    monkeypatch.setattr(data_syncer, "get_embeddings", lambda: None)
+    # Mock FAISS.from_texts to return a dummy vector store
     class DummyVS:
+        def __init__(self, texts):
+            self.texts = list(texts)
+        def add_texts(self, texts, metadatas=None):
+            self.texts.extend(texts)
         def save_local(self, path):
-            with open(os.path.join(path, "dummy"), "w") as f:
-                f.write("ok")
-    monkeypatch.setattr("langchain.vectorstores.FAISS.from_documents", lambda docs, emb: DummyVS())
-    NotionDBDataLoader.local_vector_store_path = str(tmp_path)
-    NotionDBDataLoader.persist_vector_store()
-    assert os.path.exists(os.path.join(tmp_path, "dummy"))
+            with open(os.path.join(path, "dummy"), "w", encoding="utf-8") as f:
+                f.write("\n".join(self.texts))
+    monkeypatch.setattr("langchain_community.vectorstores.FAISS.from_texts",
+                        lambda texts, embeddings, metadatas=None: DummyVS(texts))
+    monkeypatch.setattr(NotionDBDataSyncer, "local_vector_store_path", str(tmp_path))
+    NotionDBDataSyncer.persist_vector_store()
+    with open(os.path.join(tmp_path, "dummy"), encoding="utf-8") as f:
+        assert "悦华珍珠品牌定位" in f.read()
@@ -1,18 +1,10 @@
-import os
-import sys
 import time
 import hashlib
 import pytest
-from fastapi.testclient import TestClient
-from fastapi import FastAPI
 
-# Dynamically add backend to sys.path to ensure that the app package can be imported
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app.wx import router, WECHAT_TOKEN
-
-app = FastAPI()
-app.include_router(router)
-client = TestClient(app)
+# The handler module imports the agent, skip instead of erroring when LangChain is missing
+pytest.importorskip("langchain_openai")
+from app.handler.wechat_handler import WECHAT_TOKEN, WeChatHandler
 
 def make_signature(token, timestamp, nonce):
     check_list = [token, timestamp, nonce]
@@ -20,7 +12,7 @@ def make_signature(token, timestamp, nonce):
     check_str = ''.join(check_list)
     return hashlib.sha1(check_str.encode('utf-8')).hexdigest()
 
-def test_wechat_check():
+def test_wechat_check(client):
     timestamp = str(int(time.time()))
     nonce = "123456"
     echostr = "hello_wechat"
@@ -34,7 +26,7 @@ def test_wechat_check():
     assert resp.status_code == 200
     assert resp.text == echostr
 
-def test_wechat_check_invalid_signature():
+def test_wechat_check_invalid_signature(client):
     timestamp = str(int(time.time()))
     nonce = "123456"
     echostr = "hello_wechat"
@@ -48,11 +40,8 @@ def test_wechat_check_invalid_signature():
     assert resp.status_code == 403
     assert resp.text == "signature error"
 
-def test_wechat_text_message(monkeypatch):
-    from_user = "user123"
-    to_user = "gh_abcdefg"
-    content = "珍珠是什么？"
-    xml = f"""<xml>
+def make_text_message(from_user, to_user, content):
+    return f"""<xml>
     <ToUserName><![CDATA[{to_user}]]></ToUserName>
     <FromUserName><![CDATA[{from_user}]]></FromUserName>
     <CreateTime>{int(time.time())}</CreateTime>
@@ -60,11 +49,30 @@ def test_wechat_text_message(monkeypatch):
     <Content><![CDATA[{content}]]></Content>
     <MsgId>1234567890</MsgId>
     </xml>"""
+
+def test_wechat_text_message(client, monkeypatch):
+    # Answer without calling the LLM, /wechat/legacy replies with the answer inline
+    async def fake_answer(cls, question, user_id, chat_history):
+        return "珍珠是贝类分泌珍珠质形成的有机宝石。"
+    monkeypatch.setattr(WeChatHandler, "_safe_agent_answer", classmethod(fake_answer))
+    xml = make_text_message("user123", "gh_abcdefg", "珍珠是什么？")
+    resp = client.post("/wechat/legacy", data=xml.encode("utf-8"), headers={"Content-Type": "application/xml"})
+    assert resp.status_code == 200
+    assert "有机宝石" in resp.text
+
+def test_wechat_text_message_background(client, monkeypatch):
+    # /wechat replies with a placeholder and answers through the WeChat API in the background
+    answered = []
+    async def fake_process_and_reply(cls, user_id, content):
+        answered.append((user_id, content))
+    monkeypatch.setattr(WeChatHandler, "process_and_reply", classmethod(fake_process_and_reply))
+    xml = make_text_message("user456", "gh_abcdefg", "珍珠是什么？")
     resp = client.post("/wechat", data=xml.encode("utf-8"), headers={"Content-Type": "application/xml"})
     assert resp.status_code == 200
-    assert "珍珠" in resp.text
+    assert "让我思考下哈" in resp.text
+    assert answered == [("user456", "珍珠是什么？")]
 
-def test_wechat_event_subscribe():
+def test_wechat_event_subscribe(client):
     from_user = "user123"
     to_user = "gh_abcdefg"
     xml = f"""<xml>
@@ -0,0 +1,53 @@
+import pytest
+
+# The handler module imports the agent, skip instead of erroring when LangChain is missing
+pytest.importorskip("langchain_openai")
+from app.handler.wechat_handler import WeChatHandler
+
+def make_message(content_xml):
+    return f"""<xml>
+    <ToUserName><![CDATA[gh_abcdefg]]></ToUserName>
+    <FromUserName><![CDATA[user123]]></FromUserName>
+    <CreateTime>1700000000</CreateTime>
+    <MsgType><![CDATA[text]]></MsgType>
+    <Content>{content_xml}</Content>
+    <MsgId>1234567890</MsgId>
+    </xml>""".encode("utf-8")
+
+def test_parse_text_message():
+    msg = WeChatHandler.parse_wechat_message(make_message("<![CDATA[珍珠是什么？]]>"))
+    assert msg == {
+        "MsgType": "text",
+        "FromUserName": "user123",
+        "ToUserName": "gh_abcdefg",
+        "Content": "珍珠是什么？",
+        "Event": None,
+        "CreateTime": "1700000000",
+    }
+
+def test_parse_accepts_str():
+    msg = WeChatHandler.parse_wechat_message(make_message("<![CDATA[珍珠]]>").decode("utf-8"))
+    assert msg["Content"] == "珍珠"
+
+@pytest.mark.parametrize("content_xml, expected", [
+    ("&#20320;&#x597D;", "你好"),
+    ("&quot;a&quot; &apos;b&apos; &lt;c&gt; &amp;", "\"a\" 'b' <c> &"),
+    ("<![CDATA[a]]]]><![CDATA[>b]]>", "a]]>b"),
+    (" <![CDATA[珍珠]]> ", " 珍珠 "),
+    # An empty element has no text, findtext() reports it as an empty string
+    ("", ""),
+])
+def test_parse_content_matches_xml_semantics(content_xml, expected):
+    msg = WeChatHandler.parse_wechat_message(make_message(content_xml))
+    assert msg["Content"] == expected
+
+def test_parse_event_message():
+    msg = WeChatHandler.parse_wechat_message(
+        b"<xml><FromUserName><![CDATA[user123]]></FromUserName>"
+        b"<MsgType><![CDATA[event]]></MsgType><Event><![CDATA[subscribe]]></Event></xml>")
+    assert msg["MsgType"] == "event"
+    assert msg["Event"] == "subscribe"
+    assert msg["Content"] is None
+
+def test_parse_invalid_xml():
+    assert WeChatHandler.parse_wechat_message(b"<xml><MsgType>text</xml>") is None
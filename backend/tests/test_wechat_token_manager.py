@@ -0,0 +1,130 @@
+import asyncio
+import json
+import pytest
+
+pytest.importorskip("httpx")
+from app.auth import wechat_token_manager
+from app.auth.wechat_token_manager import WeChatTokenManager
+
+
+class FakeResponse:
+    def __init__(self, token, expires_in):
+        self.content = json.dumps({"access_token": token, "expires_in": expires_in}).encode("utf-8")
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeClient:
+    """Token endpoint stand-in, each call returns token-<n> and can be held open by a gate"""
+    def __init__(self, expires_in=7200):
+        self.expires_in = expires_in
+        self.calls = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def get(self, url):
+        self.calls += 1
+        call = self.calls
+        await self.gate.wait()
+        return FakeResponse(f"token-{call}", self.expires_in)
+
+
+def make_manager(monkeypatch, client):
+    async def get_http_client():
+        return client
+    monkeypatch.setattr(wechat_token_manager, "get_http_client", get_http_client)
+    # Credentials as if from the environment, so the test doesn't depend on config.ini
+    monkeypatch.setattr(wechat_token_manager, "_WECHAT_APPID", "test-appid")
+    monkeypatch.setattr(wechat_token_manager, "_WECHAT_SECRET", "test-secret")
+    return WeChatTokenManager()
+
+
+def test_concurrent_callers_share_one_refresh(monkeypatch):
+    async def run():
+        client = FakeClient()
+        manager = make_manager(monkeypatch, client)
+        client.gate.clear()
+        callers = [asyncio.create_task(manager.get_access_token()) for _ in range(10)]
+        await asyncio.sleep(0)
+        client.gate.set()
+        tokens = await asyncio.gather(*callers)
+        assert client.calls == 1
+        assert tokens == ["token-1"] * 10
+        # A valid cached token is served without another request
+        assert await manager.get_access_token() == "token-1"
+        assert client.calls == 1
+        manager.invalidate_token()
+    asyncio.run(run())
+
+
+def test_cancelled_caller_does_not_poison_followers(monkeypatch):
+    async def run():
+        client = FakeClient()
+        manager = make_manager(monkeypatch, client)
+        client.gate.clear()
+        first = asyncio.create_task(manager.get_access_token())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(manager.get_access_token())
+        await asyncio.sleep(0)
+        # Cancelling the caller that started the refresh must not cancel the refresh itself
+        first.cancel()
+        await asyncio.sleep(0)
+        client.gate.set()
+        assert await second == "token-1"
+        assert first.cancelled()
+        assert client.calls == 1
+        manager.invalidate_token()
+    asyncio.run(run())
+
+
+def test_background_refresh_replaces_token_before_expiry(monkeypatch):
+    async def run():
+        client = FakeClient(expires_in=0.05)
+        manager = make_manager(monkeypatch, client)
+        manager._refresh_buffer_seconds = 0
+        manager._bg_refresh_margin_seconds = 0.02
+        assert await manager.get_access_token() == "token-1"
+        assert manager._bg_task is not None
+        await asyncio.sleep(0.05)
+        assert client.calls >= 2
+        assert manager._access_token == f"token-{client.calls}"
+        manager.invalidate_token()
+    asyncio.run(run())
+
+
+def test_invalidate_keeps_in_flight_background_refresh(monkeypatch):
+    async def run():
+        client = FakeClient(expires_in=0.05)
+        manager = make_manager(monkeypatch, client)
+        manager._refresh_buffer_seconds = 0
+        manager._bg_refresh_margin_seconds = 0.02
+        assert await manager.get_access_token() == "token-1"
+        # Hold the background refresh open at the token endpoint
+        client.gate.clear()
+        while client.calls < 2:
+            await asyncio.sleep(0.005)
+        bg_task = manager._bg_task
+        manager.invalidate_token()
+        assert not bg_task.cancelled()
+        # The retry after invalidation waits on the in-flight refresh instead of getting None
+        retry = asyncio.create_task(manager.get_access_token())
+        await asyncio.sleep(0)
+        client.gate.set()
+        assert await retry == "token-2"
+        assert client.calls == 2
+        manager.invalidate_token()
+    asyncio.run(run())
+
+
+def test_invalidate_cancels_sleeping_background_refresh(monkeypatch):
+    async def run():
+        client = FakeClient()
+        manager = make_manager(monkeypatch, client)
+        assert await manager.get_access_token() == "token-1"
+        bg_task = manager._bg_task
+        manager.invalidate_token()
+        await asyncio.sleep(0)
+        assert bg_task.cancelled()
+        assert manager._bg_task is None
+    asyncio.run(run())